@@ -0,0 +1,7 @@
+var dmcfuncs = window.dashMantineFunctions = window.dashMantineFunctions || {};
+
+// Options of server-searched selects are already matched and ranked by the
+// server, so keep them as they are instead of re-filtering by substring
+dmcfuncs.keepServerOptions = function ({ options }) {
+    return options;
+};
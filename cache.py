@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+
+import pandas as pd
+import plotly
+
+from utils import current_dir, dataset_version
+
+# Shared result cache for all dashboard workers.
+# Every gunicorn/uwsgi worker opens the same SQLite file, so a view computed by
+# one worker is served from disk by the others instead of being rebuilt per
+# process. Keys carry the dataset version and a results version, so a new data
+# file, a change to the code producing cached frames and figures, or a pandas/
+# plotly upgrade all start cold. The least recently used entries are evicted
+# beyond MAX_ENTRIES, since arbitrary airline selections make the key space unbounded.
+cache_dir = os.environ.get('AIRLINE_SAFETY_CACHE_DIR', os.path.join(current_dir, '.cache'))
+cache_path = os.path.join(cache_dir, 'results.sqlite')
+
+LOCK_TIMEOUT = 30.0   # seconds before a stale single-flight lock is taken over
+POLL_INTERVAL = 0.05  # seconds between checks while another worker computes
+MAX_ENTRIES = int(os.environ.get('AIRLINE_SAFETY_CACHE_MAX_ENTRIES', 5000))
+TOUCH_INTERVAL = 60.0  # seconds; a hit refreshes its access time at most this often
+
+# Bump when the layout of cached values changes in a way the source hash below misses
+CACHE_SCHEMA = 2
+# Modules whose code determines the cached frames and figures
+result_modules = ['charts.py', 'query_engine.py', 'utils.py', 'risk.py', 'datasource.py', 'datastore.py']
+
+
+def results_version(version=dataset_version):
+    digest = hashlib.sha1(f'{version}:{CACHE_SCHEMA}:{pd.__version__}:{plotly.__version__}'.encode())
+    for module in result_modules:
+        with open(os.path.join(current_dir, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    def __init__(self, path=cache_path, version=None, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.version = version or results_version()
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS results '
+                         '(key TEXT PRIMARY KEY, value BLOB, created REAL, accessed REAL DEFAULT 0)')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(results)')]
+            if 'accessed' not in columns:
+                # Cache files from before eviction existed
+                conn.execute('ALTER TABLE results ADD COLUMN accessed REAL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+            conn.execute('CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, expires REAL)')
+
+    def _connect(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def make_key(self, namespace, *parts):
+        digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+        return f'{namespace}:{self.version}:{digest}'
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute('SELECT value, accessed FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now - TOUCH_INTERVAL:
+            conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO results (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now, now)
+        )
+        self._evict()
+
+    def _evict(self):
+        # Least recently used entries beyond the row cap
+        conn = self._connect()
+        excess = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute('DELETE FROM results WHERE key IN '
+                         '(SELECT key FROM results ORDER BY accessed LIMIT ?)', (excess,))
+
+    def _acquire(self, key):
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT expires FROM locks WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[0] > now:
+                conn.execute('COMMIT')
+                return False
+            conn.execute('INSERT OR REPLACE INTO locks (key, expires) VALUES (?, ?)', (key, now + LOCK_TIMEOUT))
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _release(self, key):
+        self._connect().execute('DELETE FROM locks WHERE key = ?', (key,))
+
+    def get_or_compute(self, key, compute):
+        # Single-flight: only the worker holding the lock computes a cold key,
+        # the others wait for its result instead of repeating the work
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        deadline = time.time() + LOCK_TIMEOUT
+        held = self._acquire(key)
+        while not held:
+            time.sleep(POLL_INTERVAL)
+            value = self.get(key)
+            if value is not None:
+                return value
+            if time.time() > deadline:
+                break
+            held = self._acquire(key)
+
+        try:
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                self.set(key, value)
+            return value
+        finally:
+            if held:
+                self._release(key)
+
+    def clear_stale(self):
+        # Drop entries computed for other dataset or results versions
+        conn = self._connect()
+        conn.execute('DELETE FROM results WHERE key NOT LIKE ?', (f'%:{self.version}:%',))
+        conn.execute('DELETE FROM locks WHERE expires < ?', (time.time(),))
+
+
+result_cache = ResultCache()
+result_cache.clear_stale()
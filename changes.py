@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+import utils
+from datastore import metrics as cube_metrics
+
+# Period-over-period change tables (1985-1999 -> 2000-2014) for every metric.
+# All metrics are stacked into (airline x metric) arrays, taken from the
+# per-airline count and rate arrays in utils, and the absolute change,
+# percentage change and log-ratio are computed in one vectorized pass.
+# Zero bases are classified explicitly instead of being hidden by fillna(0):
+#   no_events   0 -> 0   pct_change 0,   log_ratio 0
+#   new_events  0 -> n   pct_change NaN, log_ratio NaN (no finite ratio exists)
+#   eliminated  n -> 0   pct_change -100, log_ratio NaN
+#   change      n -> m   both finite
+#   missing     either period unknown, everything NaN
+# The improvement score in utils is computed with change_arrays as well, and
+# df_wide shows the change kind of each rate behind it (<rate>_change_kind).
+change_metrics = [
+    'incidents', 'fatal_accidents', 'fatalities',
+    'incident_rate', 'fatal_accident_rate', 'fatality_rate'
+]
+change_kinds = ['change', 'no_events', 'new_events', 'eliminated', 'missing']
+
+
+def change_arrays(before, after):
+    # Elementwise changes between two arrays of period values; the kind as
+    # codes into change_kinds
+    before, after = np.asarray(before, dtype=float), np.asarray(after, dtype=float)
+    missing = np.isnan(before) | np.isnan(after)
+    zero_before, zero_after = before == 0, after == 0
+    kind = np.select(
+        [missing, zero_before & zero_after, zero_before, zero_after],
+        [change_kinds.index(kind) for kind in ['missing', 'no_events', 'new_events', 'eliminated']],
+        default=change_kinds.index('change')
+    ).astype(np.int8)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        abs_change = after - before
+        pct_change = np.where(zero_before, np.where(zero_after, 0.0, np.nan), abs_change / before * 100)
+        log_ratio = np.where(zero_before & zero_after, 0.0, np.log(after / before))
+    log_ratio[~np.isfinite(log_ratio)] = np.nan
+    return abs_change, pct_change, log_ratio, kind
+
+
+def period_values(metric):
+    # (airline x period) values of a count or rate metric
+    rates = {rate: count for count, rate in utils.rate_names.items()}
+    if metric in rates:
+        return utils.airline_rates[:, :, cube_metrics.index(rates[metric])]
+    return np.asarray(utils.airline_counts[:, :, cube_metrics.index(metric)], dtype=float)
+
+
+def compute_changes(metrics=change_metrics):
+    values = [period_values(metric) for metric in metrics]
+    before = np.column_stack([value[:, 0] for value in values])
+    after = np.column_stack([value[:, -1] for value in values])
+    abs_change, pct_change, log_ratio, kind = change_arrays(before, after)
+
+    # Long table indexed by (metric, airline), metric-major so each metric is one slice
+    index = pd.MultiIndex.from_product([metrics, utils.wide_column('airline')], names=['metric', 'airline'])
+    return pd.DataFrame({
+        'before': before.T.ravel(),
+        'after': after.T.ravel(),
+        'abs_change': abs_change.T.ravel(),
+        'pct_change': pct_change.T.ravel(),
+        'log_ratio': log_ratio.T.ravel(),
+        'change_kind': pd.Categorical.from_codes(kind.T.ravel(), categories=change_kinds)
+    }, index=index).sort_index()
+
+
+@utils.derived('change_tables')
+def _materialize():
+    # The change table, with a (metric, airline) -> row map and plain column
+    # arrays for fast point lookups
+    table = compute_changes()
+    positions = {key: i for i, key in enumerate(table.index)}
+    columns = {col: table[col].to_numpy() for col in table.columns}
+    return table, positions, columns
+
+
+def get_change_table():
+    return _materialize()[0]
+
+
+def metric_changes(metric):
+    # All airlines for one metric, indexed by airline
+    return get_change_table().loc[metric]
+
+
+def airline_change(metric, airline):
+    _, positions, columns = _materialize()
+    row = positions[(metric, airline)]
+    return {col: values[row] for col, values in columns.items()}
@@ -0,0 +1,312 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import utils
+from cache import result_cache
+from query_engine import get_engine
+from risk import risk_categorical, risk_labels
+from trends import WINDOW, get_trends
+from utils import colors, improvement_labels, source
+
+# Backend for the filtering and aggregations below (AIRLINE_SAFETY_QUERY_ENGINE)
+query_engine = get_engine()
+
+# Aggregates behind the charts when the source computes them: every (airline,
+# period, metric) cell in df_long order for the bars and heatmap, and
+# per-airline totals (sorted by airline, as groupby does) for the risk and
+# improvement charts
+chart_queries = [(['airline', 'period', 'metric_type'], False), (['airline'], True)]
+
+
+def normalize_filters(selected_periods=None, selected_airlines=None, improvement_status=None,
+                      risk_categories=None, metric_types=None):
+    # Order-independent tuple of the filter selections, used as the cache key
+    return tuple(
+        tuple(sorted(selection or []))
+        for selection in (selected_periods, selected_airlines, improvement_status,
+                          risk_categories, metric_types)
+    )
+
+
+def get_filtered_data(*filters):
+    # The filtered slice of df_long behind the in-memory chart path
+    filters = normalize_filters(*filters)
+    key = result_cache.make_key('frame', filters)
+    return result_cache.get_or_compute(key, lambda: filter_data(*filters))
+
+
+def get_figures(*filters):
+    filters = normalize_filters(*filters)
+    key = result_cache.make_key('figures', filters)
+    # Stored as plain figure dicts: they unpickle far faster than go.Figure objects
+    return result_cache.get_or_compute(
+        key,
+        lambda: [fig.to_plotly_json() for fig in build_figures(chart_data(*filters))]
+    )
+
+
+def airline_filter(selected_airlines=None, improvement_status=None, risk_categories=None):
+    # Risk category and improvement status are derived per airline, so together
+    # with the airline selection they become one list of airlines pushed down
+    # to the source; None when nothing narrows it
+    if not (selected_airlines or improvement_status or risk_categories):
+        return None
+    if selected_airlines:
+        positions = np.array(sorted({utils.airline_index[a] for a in selected_airlines if a in utils.airline_index}),
+                             dtype=np.int64)
+    else:
+        positions = np.arange(len(utils.airline_risk_codes))
+    if improvement_status:
+        codes = [improvement_labels.index(status) for status in improvement_status if status in improvement_labels]
+        positions = positions[np.isin(utils.airline_status_codes[positions], codes)]
+    if risk_categories:
+        codes = [risk_labels.index(risk) for risk in risk_categories if risk in risk_labels]
+        positions = positions[np.isin(utils.airline_risk_codes[positions], codes)]
+    return utils.wide_column('airline', positions).tolist()
+
+
+def with_attributes(frame, columns):
+    # Adds the per-airline risk category and/or improvement status
+    positions = frame['airline'].map(utils.airline_index).to_numpy(dtype=np.int64)
+    if 'risk_category' in columns:
+        frame['risk_category'] = risk_categorical(utils.airline_risk_codes, positions)
+    if 'improvement_status' in columns:
+        frame['improvement_status'] = utils.wide_column('improvement_status', positions)
+    return frame
+
+
+def fetch_filtered_data(selected_periods=None, selected_airlines=None, improvement_status=None,
+                        risk_categories=None, metric_types=None):
+    # Pushes the filters down to the data source
+    airlines = airline_filter(selected_airlines, improvement_status, risk_categories)
+    if airlines is not None and not airlines:
+        return pd.DataFrame(columns=utils.long_columns)
+    filtered_df = source.fetch_long(selected_periods, airlines, metric_types)
+    return with_attributes(filtered_df, ['risk_category', 'improvement_status'])
+
+
+def filter_data(selected_periods=None, selected_airlines=None, improvement_status=None,
+                risk_categories=None, metric_types=None):
+    if source.supports_pushdown:
+        return fetch_filtered_data(selected_periods, selected_airlines, improvement_status,
+                                   risk_categories, metric_types)
+
+    return query_engine.filter(utils.df_long, [selected_periods, selected_airlines, improvement_status,
+                                               risk_categories, metric_types])
+
+
+def chart_tables(filtered_df):
+    # The tables drawn by build_figures, from a filtered slice of df_long
+    return {
+        'incidents': filtered_df[filtered_df['metric_type'] == 'incidents'],
+        'fatalities': filtered_df[filtered_df['metric_type'] == 'fatalities'],
+        'pivot': query_engine.pivot_sum(filtered_df, "airline", ["period", "metric_type"], "value"),
+        'risk': query_engine.group_sum(filtered_df, ['airline', 'risk_category'], 'value'),
+        'improvement': query_engine.group_sum(filtered_df, ['airline', 'improvement_status'], 'value')
+    }
+
+
+def fetch_chart_tables(selected_periods=None, selected_airlines=None, improvement_status=None,
+                       risk_categories=None, metric_types=None):
+    # The same tables with the grouping and sums done by the source
+    # (source.aggregate); only pandas reshaping and per-airline labels remain here
+    airlines = airline_filter(selected_airlines, improvement_status, risk_categories)
+    if airlines is not None and not airlines:
+        cells = pd.DataFrame(columns=['airline', 'period', 'metric_type', 'value'])
+        totals = pd.DataFrame(columns=['airline', 'value'])
+    else:
+        query = (selected_periods, airlines, metric_types)
+        cells, totals = (source.aggregate(group_by, *query, sort=sort) for group_by, sort in chart_queries)
+        # Likely next views: drilling down into one of the selected periods or metrics
+        drilldowns = ([([period], airlines, metric_types) for period in selected_periods or []
+                       if len(selected_periods) > 1] +
+                      [(selected_periods, airlines, [metric]) for metric in metric_types or []
+                       if len(metric_types) > 1])
+        source.prefetch([(group_by, sort, *drilldown) for drilldown in drilldowns
+                         for group_by, sort in chart_queries])
+
+    # Sums over unknown values only come back unknown; groupby would give 0
+    # Sorted both ways, as pivot_table returns it
+    pivot_data = cells.pivot(index='airline', columns=['period', 'metric_type'], values='value')
+    pivot_data = pivot_data.sort_index().sort_index(axis=1)
+    if pivot_data.isna().any(axis=None):
+        pivot_data = pivot_data.fillna(0)
+    totals = totals.assign(value=totals['value'].fillna(0))
+    return {
+        'incidents': cells[cells['metric_type'] == 'incidents'],
+        'fatalities': cells[cells['metric_type'] == 'fatalities'],
+        'pivot': pivot_data,
+        'risk': with_attributes(totals[['airline']].copy(), ['risk_category']).assign(value=totals['value']),
+        'improvement': with_attributes(totals[['airline']].copy(), ['improvement_status']).assign(value=totals['value'])
+    }
+
+
+def chart_data(selected_periods=None, selected_airlines=None, improvement_status=None,
+               risk_categories=None, metric_types=None):
+    filters = (selected_periods, selected_airlines, improvement_status, risk_categories, metric_types)
+    if source.supports_pushdown:
+        return fetch_chart_tables(*filters)
+    return chart_tables(get_filtered_data(*filters))
+
+
+def build_figures(tables):
+    # Chart 1: Incident Trends
+    incident_df = tables['incidents']
+    fig1 = px.bar(
+        incident_df,
+        x="airline", y="value", color="period",
+        barmode="group",
+        title="✈️ Incident Trends Comparison (1985-1999 vs 2000-2014)",
+        labels={'value': 'Number of Incidents', 'airline': 'Airline'},
+        color_discrete_sequence=[colors['primary'], colors['accent']],
+        height=500
+    )
+    fig1.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font={'color': colors['text_primary']},
+        xaxis_tickangle=-45
+    )
+    
+    # Chart 2: Fatalities Analysis
+    fatalities_df = tables['fatalities']
+    fig2 = px.bar(
+        fatalities_df,
+        x="airline", y="value", color="period",
+        barmode="group",
+        title="💀 Fatalities Analysis (1985-1999 vs 2000-2014)",
+        labels={'value': 'Number of Fatalities', 'airline': 'Airline'},
+        color_discrete_sequence=[colors['danger'], colors['warning']],
+        height=500
+    )
+    fig2.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font={'color': colors['text_primary']},
+        xaxis_tickangle=-45
+    )
+    
+    # Chart 3: Safety Metrics Heatmap
+    pivot_data = tables['pivot']
+    
+    if not pivot_data.empty:
+        fig3 = px.imshow(
+            pivot_data,
+            aspect="auto",
+            title="🔥 Safety Metrics Heatmap by Airline",
+            color_continuous_scale="Blues",
+            height=600
+        )
+        fig3.update_layout(
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            font={'color': colors['text_primary']}
+        )
+    else:
+        fig3 = go.Figure()
+        fig3.update_layout(
+            title="No data available for selected filters",
+            plot_bgcolor='white',
+            paper_bgcolor='white'
+        )
+    
+    # Chart 4: Risk Analysis
+    risk_analysis = tables['risk']
+    if not risk_analysis.empty:
+        fig4 = px.treemap(
+            risk_analysis,
+            path=['risk_category', 'airline'],
+            values='value',
+            title='⚠️ Risk Distribution Across Airlines',
+            color='value',
+            color_continuous_scale='RdYlGn_r',
+            height=500
+        )
+        fig4.update_layout(
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            font={'color': colors['text_primary']}
+        )
+    else:
+        fig4 = go.Figure()
+        fig4.update_layout(
+            title="No data available for selected filters",
+            plot_bgcolor='white',
+            paper_bgcolor='white'
+        )
+    
+    # Chart 5: Improvement Tracking
+    improvement_data = tables['improvement']
+    if not improvement_data.empty:
+        fig5 = px.sunburst(
+            improvement_data,
+            path=['improvement_status', 'airline'],
+            values='value',
+            title='🔄 Safety Improvement Tracking',
+            height=500,
+            color_discrete_sequence=[colors['success'], colors['warning'], colors['danger'], colors['secondary'], colors['primary']]
+        )
+        fig5.update_layout(
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            font={'color': colors['text_primary']}
+        )
+    else:
+        fig5 = go.Figure()
+        fig5.update_layout(
+            title="No data available for selected filters",
+            plot_bgcolor='white',
+            paper_bgcolor='white'
+        )
+    
+    return fig1, fig2, fig3, fig4, fig5
+
+
+def build_trend_figure(selected_airlines=None, metric_types=None, top=5):
+    # Yearly rolling and EWMA rates from the precomputed trend arrays, with change
+    # points marked when the yearly counts are real rather than estimated
+    trends = get_trends()
+    metric = next((m for m in metric_types or [] if m in trends.metrics), 'incidents')
+    arrays = trends.metrics[metric]
+    if selected_airlines:
+        airlines = [a for a in selected_airlines if a in trends.positions]
+    else:
+        # Without a selection: the airlines with the most events
+        totals = np.nansum(arrays['counts'], axis=1)
+        airlines = trends.airlines[np.argsort(-totals, kind='stable')[:top]].tolist()
+
+    label = metric.replace('_', ' ')
+    title = f"📉 Yearly {label.title()} Trends ({WINDOW}-year rolling rate and EWMA)"
+    if trends.estimated:
+        title += "<br><sup>Estimated: period totals spread evenly over each period's years</sup>"
+
+    fig = go.Figure()
+    palette = px.colors.qualitative.Plotly
+    for i, airline in enumerate(airlines):
+        series = trends.series(airline, metric)
+        color = palette[i % len(palette)]
+        fig.add_trace(go.Scatter(x=series.index, y=series['rolling_rate'], name=airline,
+                                 legendgroup=airline, mode='lines', line={'color': color}))
+        fig.add_trace(go.Scatter(x=series.index, y=series['ewma_rate'], name=f'{airline} (EWMA)',
+                                 legendgroup=airline, mode='lines', showlegend=False,
+                                 line={'color': color, 'dash': 'dot'}))
+        if trends.estimated:
+            continue
+        points = series[series['change_point']]
+        fig.add_trace(go.Scatter(x=points.index, y=points['ewma_rate'], name=f'{airline} change point',
+                                 legendgroup=airline, mode='markers', showlegend=False,
+                                 marker={'color': color, 'symbol': 'diamond', 'size': 11},
+                                 customdata=points['change_z'],
+                                 hovertemplate='%{x}: change point (z = %{customdata:.1f})<extra></extra>'))
+    fig.update_layout(
+        title=title,
+        xaxis_title='Year',
+        yaxis_title=f'{label.capitalize()} per year per 1e9 weekly seat-km',
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font={'color': colors['text_primary']},
+        height=500
+    )
+    return fig
@@ -0,0 +1,341 @@
+import os
+import sys
+import queue
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from datastore import SafetyStore, count_cube, periods, metrics
+
+# Pluggable sources for the airline safety records.
+# Every source returns the raw wide layout (airline, avail_seat_km_per_week,
+# <metric>_<period suffix>...) through load_frame(), the same data as arrays
+# (exposure per airline and the airline x period x metric count cube) through
+# arrays() and airlines(), plus a version string.
+# Sources that can evaluate queries themselves (supports_pushdown) also serve
+# filtered long-format slices and SUM(value) aggregates, so update_charts only
+# pulls the groups it draws. Select a source with AIRLINE_SAFETY_SOURCE:
+#   path/to/file.csv                 (default: the bundled CSV)
+#   store:///path/to/dir.npyds       memory-mapped store, see datastore.py
+#   sqlite:///path/to/file.db        table airline_safety, see convert_csv()
+long_columns = ['airline', 'avail_seat_km_per_week', 'value', 'period', 'metric_type']
+group_columns = ['period', 'metric_type', 'airline']
+
+# Guards the per-process setup of connection pools and prefetch threads
+_process_lock = threading.Lock()
+
+
+def selected_blocks(selected_periods=None, metric_types=None):
+    # (period, metric) pairs in df_long order; an empty selection means no filter
+    return [(period, metric) for period in periods for metric in metrics
+            if (not selected_periods or period in selected_periods)
+            and (not metric_types or metric in metric_types)]
+
+
+def query_key(group_by, sort, selected_periods=None, selected_airlines=None, metric_types=None):
+    return (tuple(group_by), sort, *(tuple(sorted(selection or []))
+                                     for selection in (selected_periods, selected_airlines, metric_types)))
+
+
+class DataSource:
+    supports_pushdown = False
+
+    def load_frame(self):
+        raise NotImplementedError
+
+    def arrays(self):
+        # avail_seat_km_per_week per airline and the (airline x period x metric)
+        # counts, NaN where unknown
+        frame = self.load_frame()
+        return frame['avail_seat_km_per_week'].to_numpy(), count_cube(frame, np.float64)
+
+    def airlines(self):
+        return self.load_frame()['airline'].tolist()
+
+    @property
+    def version(self):
+        raise NotImplementedError
+
+    def fetch_long(self, selected_periods=None, selected_airlines=None, metric_types=None):
+        raise NotImplementedError
+
+    def aggregate(self, group_by, selected_periods=None, selected_airlines=None, metric_types=None, sort=True):
+        # SUM(value) grouped by a non-empty subset of airline/period/metric_type.
+        # sort=True orders the groups by their keys (as groupby does), sort=False
+        # in the order they first appear in df_long
+        raise NotImplementedError
+
+    def prefetch(self, queries):
+        pass
+
+    def close(self):
+        pass
+
+
+class CSVSource(DataSource):
+    def __init__(self, path):
+        self.path = path
+        self._frame = None
+
+    def load_frame(self):
+        # Parsed once; every caller gets its own copy
+        if self._frame is None:
+            self._frame = pd.read_csv(self.path)
+        return self._frame.copy()
+
+    @property
+    def version(self):
+        # Hash of the file contents: cached results are keyed by it so a data reload
+        # never serves figures computed from an older file
+        with open(self.path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class StoreSource(DataSource):
+    # Slices and aggregates are computed from store.column() views and rows of
+    # the memory-mapped cube: only the selected airlines' pages are read
+    supports_pushdown = True
+
+    def __init__(self, path):
+        self.store = SafetyStore(path)
+        self._index = None
+        self._whole = None
+
+    def load_frame(self):
+        return self.store.to_frame()
+
+    def arrays(self):
+        return self.store.exposure, self.store.counts
+
+    def airlines(self):
+        return self.store.airlines()
+
+    @property
+    def version(self):
+        return self.store.version
+
+    def _positions(self, selected_airlines):
+        # Ascending store positions of the selected airlines (all when not filtered)
+        if not selected_airlines:
+            return np.arange(len(self.store))
+        if self._index is None:
+            self._index = {airline: i for i, airline in enumerate(self.store.airlines())}
+        return np.unique(np.array([self._index[airline] for airline in selected_airlines
+                                   if airline in self._index], dtype=np.int64))
+
+    def _names(self, positions):
+        if len(positions) == len(self.store):
+            return np.array(self.store.airlines(), dtype=object)
+        return np.array([self.store.airline(i) for i in positions], dtype=object)
+
+    def fetch_long(self, selected_periods=None, selected_airlines=None, metric_types=None):
+        positions = self._positions(selected_airlines)
+        blocks = selected_blocks(selected_periods, metric_types)
+        if not blocks or not len(positions):
+            return pd.DataFrame(columns=long_columns)
+        if self._whole is None:
+            self._whole = not np.isnan(self.store.counts).any()
+        values = np.concatenate([self.store.column(period, metric)[positions] for period, metric in blocks])
+        # Same row order and dtypes as utils.df_long (period, metric, then airline)
+        return pd.DataFrame({
+            'airline': np.tile(self._names(positions), len(blocks)),
+            'avail_seat_km_per_week': np.tile(self.store.exposure[positions], len(blocks)),
+            'value': values.astype(np.int64 if self._whole else np.float64),
+            'period': np.repeat([period for period, _ in blocks], len(positions)),
+            'metric_type': np.repeat([metric for _, metric in blocks], len(positions))
+        })
+
+    def aggregate(self, group_by, selected_periods=None, selected_airlines=None, metric_types=None, sort=True):
+        positions = self._positions(selected_airlines)
+        blocks = selected_blocks(selected_periods, metric_types)
+        if not blocks or not len(positions):
+            return pd.DataFrame(columns=[*group_by, 'value'])
+        labels = {'period': list(dict.fromkeys(period for period, _ in blocks)),
+                  'metric_type': list(dict.fromkeys(metric for _, metric in blocks))}
+        # (period x metric x airline) block of the cube, summed over the dimensions
+        # not grouped by; as in SQL, a sum over unknown values only is unknown
+        cube = self.store.counts[positions][:, [self.store.periods.index(p) for p in labels['period']]]
+        cube = cube[:, :, [self.store.metrics.index(m) for m in labels['metric_type']]].transpose(1, 2, 0)
+        axes = tuple(axis for axis, column in enumerate(group_columns) if column not in group_by)
+        known = ~np.isnan(cube)
+        sums = np.where(known, cube, 0).sum(axis=axes, dtype=np.float64)
+        sums[~known.any(axis=axes)] = np.nan
+
+        kept = [column for column in group_columns if column in group_by]
+        cells = np.indices(sums.shape).reshape(len(kept), -1)
+        labels['airline'] = self._names(positions)
+        result = pd.DataFrame({column: np.asarray(labels[column], dtype=object)[cells[i]]
+                               for i, column in enumerate(kept)})
+        values = sums.ravel()
+        result['value'] = values if np.isnan(values).any() else values.astype(np.int64)
+        result = result[[*group_by, 'value']]
+        return result.sort_values(list(group_by), ignore_index=True) if sort else result
+
+
+class ConnectionPool:
+    # Fixed-size pool of read-only SQLite connections shared by request threads
+    def __init__(self, path, size=4):
+        self._connections = queue.LifoQueue()
+        for _ in range(size):
+            conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+            self._connections.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+
+class SQLiteSource(DataSource):
+    supports_pushdown = True
+
+    def __init__(self, path, table='airline_safety', pool_size=4, prefetch_workers=2, prefetch_size=32):
+        self.path = path
+        self.table = table
+        self._pool_size = pool_size
+        self._prefetch_workers = prefetch_workers
+        self._prefetch_size = prefetch_size
+        self._pid = None
+
+    def _process_state(self):
+        # Connections and threads do not survive a fork (gunicorn --preload):
+        # each process opens its own pool and prefetch executor on first use
+        if self._pid != os.getpid():
+            with _process_lock:
+                if self._pid != os.getpid():
+                    self._pool = ConnectionPool(self.path, self._pool_size)
+                    self._executor = ThreadPoolExecutor(max_workers=self._prefetch_workers,
+                                                        thread_name_prefix='prefetch')
+                    self._prefetched = OrderedDict()
+                    self._lock = threading.Lock()
+                    self._pid = os.getpid()
+
+    def _query(self, sql, params=()):
+        self._process_state()
+        with self._pool.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def load_frame(self):
+        return self._query(f'SELECT * FROM {self.table} ORDER BY rowid')
+
+    def arrays(self):
+        columns = [f'{metric}_{suffix}' for suffix in periods.values() for metric in metrics]
+        frame = self._query(f"SELECT avail_seat_km_per_week, {', '.join(columns)} FROM {self.table} ORDER BY rowid")
+        return frame['avail_seat_km_per_week'].to_numpy(), count_cube(frame, np.float64)
+
+    def airlines(self):
+        return self._query(f'SELECT airline FROM {self.table} ORDER BY rowid')['airline'].tolist()
+
+    @property
+    def version(self):
+        # Size and modification time of the database file: cheap to read in every
+        # worker, and changed by any write to the table
+        stat = os.stat(self.path)
+        return hashlib.sha256(f'{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:16]
+
+    def _long_select(self, selected_periods, selected_airlines, metric_types):
+        # Period and metric filters pick the UNION ALL branches (one per stored
+        # column); the airline filter becomes a WHERE clause in each branch
+        branches, params = [], []
+        where = ''
+        if selected_airlines:
+            where = f" WHERE airline IN ({', '.join('?' * len(selected_airlines))})"
+        order = 0
+        for period, suffix in periods.items():
+            for metric in metrics:
+                order += 1
+                if selected_periods and period not in selected_periods:
+                    continue
+                if metric_types and metric not in metric_types:
+                    continue
+                branches.append(
+                    f"SELECT airline, avail_seat_km_per_week, {metric}_{suffix} AS value, "
+                    f"'{period}' AS period, '{metric}' AS metric_type, {order} AS branch, rowid AS row "
+                    f"FROM {self.table}{where}"
+                )
+                params += list(selected_airlines or [])
+        return branches, params
+
+    def fetch_long(self, selected_periods=None, selected_airlines=None, metric_types=None):
+        branches, params = self._long_select(selected_periods, selected_airlines, metric_types)
+        if not branches:
+            return pd.DataFrame(columns=long_columns)
+        # Same row order as utils.df_long (period, metric, then airline)
+        sql = f"SELECT {', '.join(long_columns)} FROM ({' UNION ALL '.join(branches)}) ORDER BY branch, row"
+        return self._query(sql, params)
+
+    def _aggregate(self, key):
+        group_by, sort, selected_periods, selected_airlines, metric_types = key
+        branches, params = self._long_select(selected_periods, selected_airlines, metric_types)
+        columns = ', '.join(group_by)
+        if not branches:
+            return pd.DataFrame(columns=[*group_by, 'value'])
+        order = columns if sort else 'MIN(branch), MIN(row)'
+        sql = (f"SELECT {columns}, SUM(value) AS value FROM ({' UNION ALL '.join(branches)}) "
+               f"GROUP BY {columns} ORDER BY {order}")
+        return self._query(sql, params)
+
+    def aggregate(self, group_by, selected_periods=None, selected_airlines=None, metric_types=None, sort=True):
+        # Computed in SQL; picks up a matching prefetch when one was started
+        key = query_key(group_by, sort, selected_periods, selected_airlines, metric_types)
+        self._process_state()
+        with self._lock:
+            future = self._prefetched.pop(key, None)
+        if future is not None:
+            return future.result().copy()
+        return self._aggregate(key)
+
+    def prefetch(self, queries):
+        # Start likely next aggregates in the background, as
+        # (group_by, sort, selected_periods, selected_airlines, metric_types)
+        self._process_state()
+        with self._lock:
+            for query in queries:
+                key = query_key(*query)
+                if key in self._prefetched:
+                    self._prefetched.move_to_end(key)
+                    continue
+                self._prefetched[key] = self._executor.submit(self._aggregate, key)
+                while len(self._prefetched) > self._prefetch_size:
+                    self._prefetched.popitem(last=False)
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._pool.close()
+            self._pid = None
+
+
+def open_source(url):
+    if url.startswith('sqlite:///'):
+        return SQLiteSource(url[len('sqlite:///'):])
+    if url.startswith('store:///'):
+        return StoreSource(url[len('store:///'):])
+    return CSVSource(url)
+
+
+def convert_csv(csv_path, db_path, table='airline_safety'):
+    # Loads the CSV into an SQLite table for local testing of the SQL source
+    frame = pd.read_csv(csv_path)
+    with sqlite3.connect(db_path) as conn:
+        frame.to_sql(table, conn, if_exists='replace', index=False)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_airline ON {table} (airline)')
+    return len(frame)
+
+
+if __name__ == "__main__":
+    # python datasource.py airline-safety.csv airline-safety.db
+    print(f"Wrote {convert_csv(sys.argv[1], sys.argv[2])} rows to {sys.argv[2]}")
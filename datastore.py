@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Compact on-disk dataset: memory-mapped .npy arrays plus a small manifest.
+#   manifest.json   periods, metrics, shapes and the dataset version
+#   counts.npy      float32 cube (airline x period x metric), NaN where unknown;
+#                   whole counts are exact up to 2**24
+#   exposure.npy    avail_seat_km_per_week per airline
+#   names.npy       UTF-8 airline names joined by newlines (the string dictionary)
+#   name_offsets.npy  start of name i in names.npy, plus the total length
+# Opening a store only maps the files: no parsing, and pages are read lazily,
+# so startup cost does not grow with the number of airlines. Slices such as
+# counts[:, period, metric] are views on the mapped file.
+FORMAT_VERSION = 2
+
+periods = {'1985-1999': '85_99', '2000-2014': '00_14'}
+metrics = ['incidents', 'fatal_accidents', 'fatalities']
+
+
+class SafetyStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format {self.manifest['format_version']} in {path}")
+
+        self.version = self.manifest['dataset_version']
+        self.periods = self.manifest['periods']
+        self.metrics = self.manifest['metrics']
+        self.counts = np.load(os.path.join(path, 'counts.npy'), mmap_mode='r')
+        self.exposure = np.load(os.path.join(path, 'exposure.npy'), mmap_mode='r')
+        self.names = np.load(os.path.join(path, 'names.npy'), mmap_mode='r')
+        self.name_offsets = np.load(os.path.join(path, 'name_offsets.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.exposure)
+
+    def airline(self, i):
+        # Decodes a single name without touching the rest of the dictionary
+        return self.names[self.name_offsets[i]:self.name_offsets[i + 1] - 1].tobytes().decode()
+
+    def airlines(self):
+        return self.names.tobytes().decode().split('\n')[:len(self)]
+
+    def column(self, period, metric):
+        # Zero-copy view of one metric in one period for every airline
+        return self.counts[:, self.periods.index(period), self.metrics.index(metric)]
+
+    def to_frame(self):
+        # The raw CSV layout (airline, avail_seat_km_per_week, <metric>_<period suffix>...)
+        columns = {'airline': self.airlines(), 'avail_seat_km_per_week': self.exposure}
+        for period, suffix in zip(self.periods, self.manifest['period_suffixes']):
+            for metric in self.metrics:
+                values = self.column(period, metric)
+                # Whole counts come back as int64, as read_csv would infer them
+                columns[f'{metric}_{suffix}'] = values.astype(np.float64 if np.isnan(values).any() else np.int64)
+        return pd.DataFrame(columns)
+
+
+def count_cube(frame, dtype=np.float32):
+    # (airline x period x metric) counts from the raw CSV layout
+    return np.stack([
+        np.stack([frame[f'{metric}_{suffix}'].to_numpy(dtype=dtype) for metric in metrics], axis=1)
+        for suffix in periods.values()
+    ], axis=1)
+
+
+def write_store(frame, path, version):
+    os.makedirs(path, exist_ok=True)
+    counts = count_cube(frame)
+    names = frame['airline'].astype(str)
+    if names.str.contains('\n', regex=False).any():
+        raise ValueError("Airline names must not contain newlines")
+    encoded = [name.encode() + b'\n' for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+
+    np.save(os.path.join(path, 'counts.npy'), counts)
+    np.save(os.path.join(path, 'exposure.npy'), frame['avail_seat_km_per_week'].to_numpy())
+    np.save(os.path.join(path, 'names.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, 'name_offsets.npy'), offsets)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'dataset_version': version,
+        'n_airlines': len(frame),
+        'periods': list(periods),
+        'period_suffixes': list(periods.values()),
+        'metrics': metrics,
+        'counts_shape': list(counts.shape)
+    }
+    # Written last, so a store is only picked up once all arrays are complete
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def convert_csv(csv_path, path):
+    with open(csv_path, 'rb') as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:16]
+    return write_store(pd.read_csv(csv_path), path, version)
+
+
+if __name__ == "__main__":
+    # python datastore.py airline-safety.csv airline-safety.npyds
+    print(json.dumps(convert_csv(sys.argv[1], sys.argv[2]), indent=2))
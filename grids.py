@@ -0,0 +1,144 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import utils
+from datastore import periods, metrics
+from risk import risk_labels
+from scoring import score_airlines
+
+# Server-side rows for the two data grids (AG Grid infinite row model).
+# The grid asks for one block of rows at a time, with its sort and filter
+# model; the rows are cut from the per-airline arrays in utils (for the store,
+# rows of the memory-mapped cube), so neither df_wide nor df_long is built or
+# sent to the browser. Sorting or filtering evaluates the columns involved for
+# every row once; the resulting row order is kept for the next blocks of the
+# same view.
+#   wide   df_wide: one row per airline, scores under the user's weights
+#   long   df_long: row r is airline r % n_airlines in (period, metric) block r // n_airlines
+VIEW_CACHE_SIZE = 16
+
+grid_columns = {'wide': utils.wide_columns, 'long': utils.long_columns}
+text_columns = {'airline', 'period', 'metric_type', 'risk_category', 'improvement_status',
+                *utils.improvement_kind_columns}
+scored_columns = ['safety_score', 'safety_rank', 'improvement_status']
+
+number_filters = {
+    'equals': lambda values, a, b: values == a,
+    'notEqual': lambda values, a, b: values != a,
+    'lessThan': lambda values, a, b: values < a,
+    'lessThanOrEqual': lambda values, a, b: values <= a,
+    'greaterThan': lambda values, a, b: values > a,
+    'greaterThanOrEqual': lambda values, a, b: values >= a,
+    # AG Grid's default range excludes both ends
+    'inRange': lambda values, a, b: (values > a) & (values < b),
+    'blank': lambda values, a, b: np.isnan(values),
+    'notBlank': lambda values, a, b: ~np.isnan(values)
+}
+text_filters = {
+    'contains': lambda text, a: text.str.contains(a, regex=False),
+    'notContains': lambda text, a: ~text.str.contains(a, regex=False),
+    'equals': lambda text, a: text == a,
+    'notEqual': lambda text, a: text != a,
+    'startsWith': lambda text, a: text.str.startswith(a),
+    'endsWith': lambda text, a: text.str.endswith(a),
+    'blank': lambda text, a: text == '',
+    'notBlank': lambda text, a: text != ''
+}
+
+_views = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cached(key, compute):
+    with _lock:
+        if key in _views:
+            _views.move_to_end(key)
+            return _views[key]
+    value = compute()
+    with _lock:
+        _views[key] = value
+        while len(_views) > VIEW_CACHE_SIZE:
+            _views.popitem(last=False)
+    return value
+
+
+def row_count(table):
+    n_airlines = len(utils.airline_exposure)
+    return n_airlines if table == 'wide' else n_airlines * len(periods) * len(metrics)
+
+
+def column_values(table, column, rows, weights=None):
+    # One grid column for the given row numbers
+    if table == 'wide':
+        if weights is not None and column in scored_columns:
+            scores = _cached(('scores', weights), lambda: score_airlines(*map(list, weights)))
+            return scores[column].to_numpy()[rows]
+        return utils.wide_column(column, rows)
+
+    blocks, positions = np.divmod(rows, len(utils.airline_exposure))
+    period_codes, metric_codes = np.divmod(blocks, len(metrics))
+    if column == 'value':
+        counts = utils.airline_counts
+        values = np.asarray(counts[positions, period_codes, metric_codes], dtype=np.float64)
+        return values if np.isnan(values).any() else values.astype(np.int64)
+    if column == 'period':
+        return np.array(list(periods), dtype=object)[period_codes]
+    if column == 'metric_type':
+        return np.array(metrics, dtype=object)[metric_codes]
+    if column == 'risk_category':
+        return np.array(risk_labels, dtype=object)[utils.airline_risk_codes[positions]]
+    return utils.wide_column(column, positions)
+
+
+def filter_mask(values, model):
+    # One column of an AG Grid filter model (text or number filter, single
+    # condition or two combined with AND/OR) as a boolean mask
+    if 'conditions' in model:
+        masks = [filter_mask(values, condition) for condition in model['conditions']]
+        combine = np.logical_and if model.get('operator') == 'AND' else np.logical_or
+        return combine.reduce(masks)
+    if model.get('filterType') == 'number':
+        test = number_filters[model['type']]
+        with np.errstate(invalid='ignore'):
+            return test(np.asarray(values, dtype=float), model.get('filter'), model.get('filterTo'))
+    test = text_filters[model['type']]
+    text = pd.Series(values, dtype='str').fillna('').str.lower()
+    return test(text, str(model.get('filter') or '').lower()).to_numpy(dtype=bool)
+
+
+def view_rows(table, sort_model=None, filter_model=None, weights=None):
+    # Row numbers in the order shown by the grid; None when neither sorted nor filtered
+    if not sort_model and not filter_model:
+        return None
+
+    def compute():
+        rows = np.arange(row_count(table))
+        for column, model in (filter_model or {}).items():
+            rows = rows[filter_mask(column_values(table, column, rows, weights), model)]
+        if sort_model:
+            keys = pd.DataFrame({i: column_values(table, sort['colId'], rows, weights)
+                                 for i, sort in enumerate(sort_model)})
+            order = keys.sort_values(list(keys.columns), ascending=[sort['sort'] == 'asc' for sort in sort_model],
+                                     kind='stable').index.to_numpy()
+            rows = rows[order]
+        return rows
+
+    key = (table, json.dumps(sort_model, sort_keys=True), json.dumps(filter_model, sort_keys=True), weights)
+    return _cached(key, compute)
+
+
+def grid_rows(table, request, weights=None):
+    # getRowsResponse for a getRowsRequest; weights as {'safety': [...], 'improvement': [...]}
+    if weights is not None:
+        weights = (tuple(weights['safety']), tuple(weights['improvement']))
+    rows = view_rows(table, request.get('sortModel'), request.get('filterModel'), weights)
+    total = row_count(table) if rows is None else len(rows)
+    start = request.get('startRow') or 0
+    end = min(request.get('endRow') or total, total)
+    block = np.arange(start, max(start, end)) if rows is None else rows[start:end]
+    page = pd.DataFrame({column: column_values(table, column, block, weights) for column in grid_columns[table]})
+    return {'rowData': page.to_dict('records'), 'rowCount': total}
@@ -0,0 +1,345 @@
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+# Load generator for the dashboard: simulated analysts drive the same
+# _dash-update-component requests as the browser (update_charts with random
+# filter selections, and now and then one of the export callbacks) against a
+# local server, then latency percentiles, throughput and per-worker memory are
+# reported. Callback payloads are built from the server's /_dash-dependencies,
+# so they stay in step with the callbacks registered in run.py.
+#
+# Against a running server:
+#   python loadtest.py --url http://127.0.0.1:6030 --users 20 --duration 30
+# Sweep over gunicorn worker counts and synthetic dataset sizes (starts
+# `gunicorn run:server` for every combination, AIRLINE_SAFETY_SOURCE pointing
+# at a generated CSV with the given number of airlines):
+#   python loadtest.py --workers 1 2 4 --airlines 56 1000 10000 --users 20
+current_dir = os.path.dirname(os.path.abspath(__file__))
+csv_path = os.path.join(current_dir, "airline-safety.csv")
+
+filter_inputs = ['time-period', 'airlines-filter', 'improvement-status', 'risk-category', 'metric-type']
+scenarios = {
+    'update_charts': 'incident-trends-chart.figure',
+    'export_main': 'download-main-csv.data',
+    'export_detailed': 'download-detailed-csv.data'
+}
+EXPORT_PROBABILITY = 0.05
+
+
+class HTTPConnection:
+    # Minimal keep-alive HTTP/1.1 client on asyncio streams (no extra dependencies)
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b''
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nAccept-Encoding: gzip\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n")
+        self.writer.write(head.encode() + data)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            content = b''
+            while (size := int((await self.reader.readline()).split(b';')[0].strip(), 16)):
+                content += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)  # CRLF after the chunk data
+            # Trailer fields, if any, up to the blank line
+            while (await self.reader.readline()) not in (b'\r\n', b''):
+                pass
+        else:
+            content = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        if headers.get('content-encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return status, content
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def output_spec(output):
+    # '..a.figure...b.figure..' (multi-output) or 'a.figure' -> outputs payload
+    if output.startswith('..'):
+        specs = [part.rsplit('.', 1) for part in output[2:-2].split('...')]
+        return [{'id': id_, 'property': prop} for id_, prop in specs]
+    id_, prop = output.rsplit('.', 1)
+    return {'id': id_, 'property': prop}
+
+
+def callback_specs(dependencies):
+    specs = {}
+    for name, output in scenarios.items():
+        match = next((dep for dep in dependencies if output in dep['output']), None)
+        if match is None:
+            raise SystemExit(f"Callback for {output} not found on the server")
+        specs[name] = match
+    return specs
+
+
+def random_filters(rng, options):
+    # Roughly what analysts do: every filter starts fully selected and is
+    # sometimes narrowed; a handful of airlines, or all of them
+    values = {}
+    for name in filter_inputs:
+        choices = options[name]
+        if name == 'airlines-filter':
+            values[name] = rng.sample(choices, rng.randint(1, min(8, len(choices)))) if rng.random() < 0.7 else []
+        elif rng.random() < 0.6:
+            values[name] = choices
+        else:
+            values[name] = rng.sample(choices, rng.randint(1, len(choices)))
+    return values
+
+
+def callback_payload(spec, values, n_clicks):
+    inputs = []
+    for item in spec['inputs']:
+        value = values.get(item['id'], n_clicks if item['property'] == 'n_clicks' else None)
+        inputs.append({'id': item['id'], 'property': item['property'], 'value': value})
+    changed = next((f"{item['id']}.{item['property']}" for item in spec['inputs']
+                    if item['property'] == 'n_clicks'), f"{inputs[0]['id']}.{inputs[0]['property']}")
+    return {
+        'output': spec['output'],
+        'outputs': output_spec(spec['output']),
+        'inputs': inputs,
+        'changedPropIds': [changed],
+        'state': [{'id': item['id'], 'property': item['property'], 'value': values.get(item['id'])}
+                  for item in spec.get('state', [])]
+    }
+
+
+async def simulate_user(url, specs, options, deadline, think_time, seed, results):
+    rng = random.Random(seed)
+    connection = HTTPConnection(url)
+    clicks = 0
+    try:
+        while time.perf_counter() < deadline:
+            clicks += 1
+            name = 'update_charts'
+            if rng.random() < EXPORT_PROBABILITY:
+                name = rng.choice(['export_main', 'export_detailed'])
+            payload = callback_payload(specs[name], random_filters(rng, options), clicks)
+            start = time.perf_counter()
+            try:
+                status, _ = await connection.request('POST', '/_dash-update-component', payload)
+                ok = status == 200
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                await connection.close()
+                ok = False
+            results.append((name, time.perf_counter() - start, ok))
+            await asyncio.sleep(rng.expovariate(1 / think_time) if think_time else 0)
+    finally:
+        await connection.close()
+
+
+def worker_pids(master_pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; the parent pid follows its closing ')'
+        if int(stat.rsplit(')', 1)[1].split()[1]) == master_pid:
+            pids.append(int(entry))
+    return pids or [master_pid]
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+async def sample_memory(master_pid, peaks, interval=0.5):
+    while True:
+        for pid in worker_pids(master_pid):
+            peaks[pid] = max(peaks.get(pid, 0.0), rss_mb(pid))
+        await asyncio.sleep(interval)
+
+
+async def fetch_json(url, path):
+    connection = HTTPConnection(url)
+    try:
+        status, content = await connection.request('GET', path)
+    finally:
+        await connection.close()
+    if status != 200:
+        raise ConnectionError(f"GET {path} returned {status}")
+    return json.loads(content)
+
+
+async def run_load(url, options, users, duration, think_time, seed=0, master_pid=None):
+    specs = callback_specs(await fetch_json(url, '/_dash-dependencies'))
+    results, peaks = [], {}
+    sampler = asyncio.create_task(sample_memory(master_pid, peaks)) if master_pid else None
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*[
+        simulate_user(url, specs, options, deadline, think_time, seed * 1000 + i, results)
+        for i in range(users)
+    ])
+    elapsed = time.perf_counter() - start
+    if sampler:
+        sampler.cancel()
+    return summarize(results, elapsed, peaks)
+
+
+def summarize(results, elapsed, peaks):
+    frame = pd.DataFrame(results, columns=['callback', 'latency', 'ok'])
+    summary = {'requests': len(frame), 'errors': int((~frame['ok']).sum()) if len(frame) else 0,
+               'throughput': len(frame) / elapsed if elapsed else 0.0, 'latency_ms': {}}
+    for name, group in [('all', frame), *frame.groupby('callback')]:
+        latencies = group.loc[group['ok'], 'latency'].to_numpy() * 1000
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            summary['latency_ms'][name] = {'count': len(latencies), 'p50': p50, 'p95': p95, 'p99': p99}
+    if peaks:
+        summary['worker_rss_mb'] = {'per_worker': sorted(peaks.values()),
+                                    'mean': float(np.mean(list(peaks.values()))),
+                                    'max': max(peaks.values())}
+    return summary
+
+
+def synthetic_dataset(n_airlines, path, seed=0):
+    # Bundled airlines resampled with Poisson noise on the counts, under unique names
+    base = pd.read_csv(csv_path)
+    if n_airlines <= len(base):
+        frame = base.iloc[:n_airlines].copy()
+    else:
+        rng = np.random.default_rng(seed)
+        frame = base.sample(n_airlines, replace=True, random_state=seed).reset_index(drop=True)
+        frame['airline'] = [f"{name} #{i}" for i, name in enumerate(frame['airline'])]
+        counts = [col for col in frame.columns if col not in ('airline', 'avail_seat_km_per_week')]
+        frame[counts] = rng.poisson(frame[counts].to_numpy(dtype=float))
+    frame.to_csv(path, index=False)
+    return frame
+
+
+def filter_options(frame):
+    from datastore import periods, metrics
+    from risk import risk_labels
+    from utils import improvement_labels
+
+    return {
+        'time-period': list(periods),
+        'airlines-filter': frame['airline'].tolist(),
+        'improvement-status': sorted(improvement_labels),
+        'risk-category': risk_labels,
+        'metric-type': sorted(metrics)
+    }
+
+
+async def wait_until_ready(url, process, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode}")
+        try:
+            await fetch_json(url, '/_dash-dependencies')
+            return
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"Server not ready after {timeout}s")
+
+
+async def run_sweep(args):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_airlines in args.airlines:
+            data_path = os.path.join(tmp, f"airlines_{n_airlines}.csv")
+            options = filter_options(synthetic_dataset(n_airlines, data_path))
+            for workers in args.workers:
+                url = f"http://127.0.0.1:{args.port}"
+                env = dict(os.environ, AIRLINE_SAFETY_SOURCE=data_path, AIRLINE_SAFETY_WARMUP='0',
+                           AIRLINE_SAFETY_CACHE_DIR=os.path.join(tmp, f"cache_{n_airlines}_{workers}"))
+                process = subprocess.Popen(
+                    [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--timeout', '300',
+                     '--bind', f"127.0.0.1:{args.port}", 'run:server'],
+                    cwd=current_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+                try:
+                    await wait_until_ready(url, process, args.startup_timeout)
+                    summary = await run_load(url, options, args.users, args.duration, args.think_time,
+                                             args.seed, master_pid=process.pid)
+                finally:
+                    process.terminate()
+                    process.wait()
+                rows.append({'airlines': n_airlines, 'workers': workers, **summary})
+                print_summary(rows[-1])
+    return rows
+
+
+def print_summary(row):
+    label = ', '.join(f"{key}={row[key]}" for key in ('airlines', 'workers') if key in row)
+    print(f"\n{label or 'results'}: {row['requests']} requests, {row['errors']} errors, "
+          f"{row['throughput']:.1f} req/s")
+    for name, stats in row['latency_ms'].items():
+        print(f"  {name:<16} n={stats['count']:<6} p50={stats['p50']:8.1f}ms  "
+              f"p95={stats['p95']:8.1f}ms  p99={stats['p99']:8.1f}ms")
+    if 'worker_rss_mb' in row:
+        rss = row['worker_rss_mb']
+        print(f"  worker RSS       mean={rss['mean']:.0f}MB  max={rss['max']:.0f}MB  "
+              f"({len(rss['per_worker'])} processes)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the airline safety dashboard")
+    parser.add_argument('--url', help="test a running server instead of starting gunicorn")
+    parser.add_argument('--pid', type=int, help="with --url: server (master) pid for memory sampling")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="gunicorn worker counts")
+    parser.add_argument('--airlines', type=int, nargs='+', default=[56, 1000, 10000], help="dataset sizes")
+    parser.add_argument('--users', type=int, default=10, help="concurrent simulated analysts")
+    parser.add_argument('--duration', type=float, default=30, help="seconds per run")
+    parser.add_argument('--think-time', type=float, default=1.0, help="mean pause between requests (s)")
+    parser.add_argument('--port', type=int, default=8061)
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        # The airlines the server sees: same source resolution as utils
+        from datasource import open_source
+        options = filter_options(open_source(os.environ.get('AIRLINE_SAFETY_SOURCE', csv_path)).load_frame())
+        rows = [asyncio.run(run_load(args.url, options, args.users, args.duration, args.think_time,
+                                     args.seed, master_pid=args.pid))]
+        print_summary(rows[0])
+    else:
+        rows = asyncio.run(run_sweep(args))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2, default=float)
@@ -0,0 +1,107 @@
+import numpy as np
+
+import utils
+from risk import risk_labels
+from utils import available_periods, improvement_labels
+from datastore import metrics as cube_metrics
+
+# Aggregate tables behind the key metric cards.
+# The values are the source's (airline x period x metric) count cube as is
+# (for the store, the memory-mapped counts), summed once per (risk category x
+# improvement status) group. Cards for any filter selection are then read from
+# the group tables in O(selected categories), or from the cube rows of the
+# selected airlines, without building or scanning df_long.
+period_index = {period: i for i, period in enumerate(available_periods)}
+metric_index = {metric: i for i, metric in enumerate(cube_metrics)}
+# Every label, not just the ones observed: a binning can leave a category empty
+risk_index = {risk: i for i, risk in enumerate(risk_labels)}
+status_index = {status: i for i, status in enumerate(improvement_labels)}
+
+improved_statuses = [i for status, i in status_index.items() if 'Improved' in status]
+worsened_statuses = [i for status, i in status_index.items() if 'Worsened' in status]
+
+
+class KeyMetricTables:
+    def __init__(self):
+        self.value_cube = utils.airline_counts
+        self.airline_risk = utils.airline_risk_codes.astype(np.int64)
+        self.airline_status = utils.airline_status_codes.astype(np.int64)
+        self.airline_score = utils.safety_scores
+
+        # One bincount per (period, metric) column of the cube over the group ids
+        n_groups = len(risk_index) * len(status_index)
+        groups = self.airline_risk * len(status_index) + self.airline_status
+        group_shape = (len(risk_index), len(status_index))
+        self.group_values = np.zeros((n_groups,) + self.value_cube.shape[1:])
+        for i in range(self.value_cube.shape[1]):
+            for j in range(self.value_cube.shape[2]):
+                column = np.nan_to_num(np.asarray(self.value_cube[:, i, j], dtype=np.float64))
+                self.group_values[:, i, j] = np.bincount(groups, weights=column, minlength=n_groups)
+        self.group_values = self.group_values.reshape(group_shape + self.value_cube.shape[1:])
+        self.group_airlines = np.bincount(groups, minlength=n_groups).reshape(group_shape)
+        scored = ~np.isnan(self.airline_score)
+        self.group_score_sum = np.bincount(groups[scored], weights=self.airline_score[scored],
+                                           minlength=n_groups).reshape(group_shape)
+        self.group_score_count = np.bincount(groups[scored], minlength=n_groups).reshape(group_shape)
+
+
+@utils.derived('key_metric_tables')
+def get_tables():
+    return KeyMetricTables()
+
+
+def _codes(selection, index):
+    # An empty selection means no filter, matching update_charts
+    if not selection:
+        return np.arange(len(index))
+    return np.array([index[value] for value in selection if value in index], dtype=np.int64)
+
+
+def compute_key_metrics(selected_periods=None, selected_airlines=None, improvement_status=None,
+                        risk_categories=None, metric_types=None):
+    tables = get_tables()
+    periods = _codes(selected_periods, period_index)
+    risks = _codes(risk_categories, risk_index)
+    statuses = _codes(improvement_status, status_index)
+    metrics = _codes(metric_types, metric_index)
+    incident_metrics = np.intersect1d(metrics, [metric_index['incidents']])
+    fatality_metrics = np.intersect1d(metrics, [metric_index['fatalities']])
+    has_rows = len(periods) > 0 and len(metrics) > 0
+
+    if selected_airlines:
+        rows = _codes(selected_airlines, utils.airline_index)
+        rows = rows[np.isin(tables.airline_risk[rows], risks) & np.isin(tables.airline_status[rows], statuses)]
+        if not has_rows:
+            rows = rows[:0]
+        cube = np.nan_to_num(np.asarray(tables.value_cube[rows], dtype=np.float64))
+        scores = tables.airline_score[rows]
+        scores = scores[~np.isnan(scores)]
+        row_status = tables.airline_status[rows]
+
+        total_airlines = len(rows)
+        total_incidents = cube[:, periods][:, :, incident_metrics].sum()
+        total_fatalities = cube[:, periods][:, :, fatality_metrics].sum()
+        score_sum, score_count = scores.sum(), len(scores)
+        improved = np.isin(row_status, improved_statuses).sum()
+        worsened = np.isin(row_status, worsened_statuses).sum()
+    else:
+        if not has_rows:
+            risks = risks[:0]
+        groups = np.ix_(risks, statuses)
+        selected_values = tables.group_values[groups]
+
+        total_airlines = tables.group_airlines[groups].sum()
+        total_incidents = selected_values[:, :, periods][:, :, :, incident_metrics].sum()
+        total_fatalities = selected_values[:, :, periods][:, :, :, fatality_metrics].sum()
+        score_sum, score_count = tables.group_score_sum[groups].sum(), tables.group_score_count[groups].sum()
+        improved = tables.group_airlines[np.ix_(risks, np.intersect1d(statuses, improved_statuses))].sum()
+        worsened = tables.group_airlines[np.ix_(risks, np.intersect1d(statuses, worsened_statuses))].sum()
+
+    return {
+        'total_airlines': int(total_airlines),
+        'total_incidents': int(total_incidents),
+        'total_fatalities': int(total_fatalities),
+        'avg_safety_score': score_sum / score_count if score_count else float('nan'),
+        'improved_airlines': int(improved),
+        'worsened_airlines': int(worsened)
+    }
@@ -0,0 +1,170 @@
+import os
+import sys
+import random
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Execution backends for the filtering and aggregation in update_charts.
+# Both engines take and return pandas frames; they differ only in where the
+# work runs:
+#   pandas   the original isin chain, pivot_table and groupby (single-threaded)
+#   duckdb   the same operations as SQL in an embedded columnar engine that
+#            scans the pandas frames in place and parallelises across all cores
+# Select one with AIRLINE_SAFETY_QUERY_ENGINE=pandas|duckdb (default pandas).
+filter_columns = ['period', 'airline', 'improvement_status', 'risk_category', 'metric_type']
+
+
+class PandasEngine:
+    name = 'pandas'
+
+    def filter(self, frame, filters):
+        # An empty selection means no filter
+        filtered_df = frame.copy()
+        for col, selection in zip(filter_columns, filters):
+            if selection:
+                filtered_df = filtered_df[filtered_df[col].isin(selection)]
+        return filtered_df
+
+    def pivot_sum(self, frame, index, columns, values):
+        return frame.pivot_table(index=index, columns=columns, values=values, aggfunc="sum").fillna(0)
+
+    def group_sum(self, frame, by, values):
+        return frame.groupby(by)[values].sum().reset_index()
+
+
+class DuckDBEngine:
+    name = 'duckdb'
+
+    def __init__(self, threads=None):
+        import duckdb
+        import pyarrow
+
+        self._arrow = pyarrow
+        self._connection = duckdb.connect()
+        self._connection.execute(f'SET threads = {threads or os.cpu_count()}')
+        self._local = threading.local()
+
+    def _cursor(self):
+        # DuckDB connections are not thread-safe; each request thread gets its own cursor
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self._connection.cursor()
+        return cursor
+
+    def _query(self, frame, columns, sql, params=()):
+        # Handed over as an Arrow table of just the needed columns: pandas' Arrow-backed
+        # strings are shared without copying, where registering the frame itself
+        # would first convert every string column to Python objects
+        table = self._arrow.Table.from_pandas(frame[columns], preserve_index=False)
+        cursor = self._cursor()
+        cursor.register('frame', table)
+        try:
+            return cursor.execute(sql, list(params)).df()
+        finally:
+            cursor.unregister('frame')
+
+    def filter(self, frame, filters):
+        conditions, params, columns = [], [], []
+        for col, selection in zip(filter_columns, filters):
+            if selection:
+                conditions.append(f'"{col}" IN ({", ".join("?" * len(selection))})')
+                params += list(selection)
+                columns.append(col)
+        if not conditions:
+            return frame.copy()
+        # Only the matching row positions come back; the rows themselves are taken
+        # from the frame, so labels, order and dtypes are exactly those of isin
+        positioned = frame[columns].assign(__position=np.arange(len(frame)))
+        sql = f"SELECT __position FROM frame WHERE {' AND '.join(conditions)} ORDER BY __position"
+        positions = self._query(positioned, [*columns, '__position'], sql, params)['__position']
+        return frame.take(positions.to_numpy())
+
+    def pivot_sum(self, frame, index, columns, values):
+        # One conditional SUM per (period, metric_type) cell, grouped by airline,
+        # so the wide table comes straight out of SQL with no reshaping in pandas
+        table_columns = [index, *columns, values]
+        cells = self._query(frame, table_columns,
+                            f"SELECT DISTINCT {', '.join(columns)} FROM frame "
+                            f"WHERE {values} IS NOT NULL ORDER BY ALL")
+        if cells.empty:
+            return PandasEngine().pivot_sum(frame, index, columns, values)
+        sums, params = [], []
+        for i, cell in enumerate(cells.itertuples(index=False)):
+            condition = ' AND '.join(f'"{col}" = ?' for col in columns)
+            sums.append(f'SUM("{values}") FILTER (WHERE {condition}) AS c{i}')
+            params += list(cell)
+        sql = (f'SELECT "{index}", {", ".join(sums)} FROM frame WHERE "{index}" IS NOT NULL '
+               f'GROUP BY "{index}" ORDER BY "{index}"')
+        result = self._query(frame, table_columns, sql, params)
+        pivot_data = result.set_index(index)
+        pivot_data.columns = pd.MultiIndex.from_frame(cells)
+        pivot_data.columns.names = columns
+        pivot_data.index = pivot_data.index.astype(frame[index].dtype)
+        # pivot_table keeps the value dtype unless some cell is empty (then float)
+        if pivot_data.notna().all(axis=None):
+            return pivot_data.astype(frame[values].dtype)
+        return pivot_data.fillna(0)
+
+    def group_sum(self, frame, by, values):
+        keys = ', '.join(f'"{col}"' for col in by)
+        # Same rows and order as groupby: missing keys dropped, keys sorted, with
+        # categorical keys (risk_category) in category order rather than alphabetically
+        not_null = ' AND '.join(f'"{col}" IS NOT NULL' for col in by)
+        order, params = [], []
+        for col in by:
+            if isinstance(frame[col].dtype, pd.CategoricalDtype):
+                order.append(f'list_position(?::VARCHAR[], "{col}")')
+                params.append([str(category) for category in frame[col].cat.categories])
+            else:
+                order.append(f'"{col}"')
+        sql = (f'SELECT {keys}, SUM("{values}") AS "{values}" FROM frame WHERE {not_null} '
+               f'GROUP BY {keys} ORDER BY {", ".join(order)}')
+        result = self._query(frame, [*by, values], sql, params)
+        for col in [*by, values]:
+            result[col] = result[col].astype(frame[col].dtype)
+        return result
+
+
+def get_engine(name=None):
+    name = name or os.environ.get('AIRLINE_SAFETY_QUERY_ENGINE', 'pandas')
+    if name == 'duckdb':
+        return DuckDBEngine()
+    if name == 'pandas':
+        return PandasEngine()
+    raise ValueError(f"Unknown query engine {name!r}, expected 'pandas' or 'duckdb'")
+
+
+def check_parity(frame, selections=200, seed=0):
+    # Compares every DuckDB operation used by update_charts with the pandas path
+    # on random filter selections; returns the list of mismatching selections
+    reference, candidate = PandasEngine(), DuckDBEngine()
+    rng = random.Random(seed)
+    values = [sorted(frame[col].dropna().unique()) for col in filter_columns]
+    mismatches = []
+    for _ in range(selections):
+        filters = [rng.sample(options, rng.randint(0, len(options))) if rng.random() < 0.7 else None
+                   for options in values]
+        try:
+            expected = reference.filter(frame, filters)
+            pd.testing.assert_frame_equal(candidate.filter(frame, filters), expected)
+            pd.testing.assert_frame_equal(
+                candidate.pivot_sum(expected, 'airline', ['period', 'metric_type'], 'value'),
+                reference.pivot_sum(expected, 'airline', ['period', 'metric_type'], 'value'))
+            for by in (['airline', 'risk_category'], ['airline', 'improvement_status']):
+                pd.testing.assert_frame_equal(candidate.group_sum(expected, by, 'value'),
+                                              reference.group_sum(expected, by, 'value'))
+        except AssertionError as error:
+            mismatches.append((filters, str(error)))
+    return mismatches
+
+
+if __name__ == "__main__":
+    from utils import df_long
+
+    mismatches = check_parity(df_long)
+    for filters, error in mismatches[:5]:
+        print(filters, error, sep='\n')
+    print(f"{len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,138 @@
+import os
+import re
+import sys
+import time
+import html
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+import utils
+from charts import build_figures, chart_data
+
+# Batch renderer for per-airline safety reports: the five update_charts
+# figures filtered to one airline, written as a static HTML page or as JSON
+# figure specs, one file per airline. Airlines are rendered in a process pool.
+# Next to each report a .sha256 sidecar records the hash of everything the
+# report depends on (the airline's rows, the chart code, plotly version and
+# output format); airlines whose hash is unchanged are skipped.
+#   python render_reports.py --out reports --format html --workers 4
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# Modules the figures are computed with: loading, risk binning and aggregation
+report_modules = ('charts.py', 'utils.py', 'query_engine.py', 'risk.py', 'datasource.py', 'datastore.py')
+
+
+def report_name(airline):
+    # File-safe name, with a short hash so names differing only in punctuation don't collide
+    slug = re.sub(r'[^0-9A-Za-z]+', '_', airline).strip('_') or 'airline'
+    return f"{slug}_{hashlib.sha1(airline.encode()).hexdigest()[:8]}"
+
+
+def code_fingerprint():
+    digest = hashlib.sha256(plotly.__version__.encode())
+    for module in report_modules:
+        with open(os.path.join(current_dir, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def airline_hashes(fmt):
+    # One hash per airline from its rows in df_long (including the derived risk
+    # and improvement columns), computed in a single pass; a data update only
+    # re-renders the airlines whose rows changed
+    df_long = utils.df_long
+    row_hashes = pd.util.hash_pandas_object(df_long, index=False)
+    fingerprint = f"{fmt}:{code_fingerprint()}"
+    hashes = {}
+    for airline, rows in row_hashes.groupby(df_long['airline'].to_numpy(), sort=False):
+        digest = hashlib.sha256(fingerprint.encode())
+        digest.update(rows.to_numpy().tobytes())
+        hashes[airline] = digest.hexdigest()
+    return hashes
+
+
+def is_current(out_dir, airline, fmt, digest):
+    name = report_name(airline)
+    sidecar = os.path.join(out_dir, f"{name}.{fmt}.sha256")
+    if not os.path.exists(os.path.join(out_dir, f"{name}.{fmt}")) or not os.path.exists(sidecar):
+        return False
+    with open(sidecar) as f:
+        return f.read().strip() == digest
+
+
+def write_atomic(path, text):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def render_airline(task):
+    airline, out_dir, fmt, digest = task
+    figures = build_figures(chart_data(None, [airline], None, None, None))
+    if fmt == 'json':
+        text = '[' + ',\n'.join(pio.to_json(fig) for fig in figures) + ']'
+    else:
+        # plotly.min.js is written once next to the reports and shared by all pages
+        charts = '\n'.join(
+            pio.to_html(fig, full_html=False, include_plotlyjs='directory' if i == 0 else False)
+            for i, fig in enumerate(figures)
+        )
+        title = html.escape(airline)
+        text = (f"<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\">"
+                f"<title>{title} - Airline Safety Report</title></head>\n"
+                f"<body>\n<h1>{title} - Airline Safety Report</h1>\n{charts}\n</body>\n</html>\n")
+    name = report_name(airline)
+    write_atomic(os.path.join(out_dir, f"{name}.{fmt}"), text)
+    # Sidecar last: an interrupted run leaves the report marked as stale
+    write_atomic(os.path.join(out_dir, f"{name}.{fmt}.sha256"), digest)
+    return airline
+
+
+def render_reports(out_dir='reports', fmt='html', workers=None, airlines=None, force=False):
+    os.makedirs(out_dir, exist_ok=True)
+    airlines = airlines or utils.available_airlines
+    hashes = airline_hashes(fmt)
+    tasks = [(airline, out_dir, fmt, hashes[airline]) for airline in airlines
+             if force or not is_current(out_dir, airline, fmt, hashes[airline])]
+    if fmt == 'html' and tasks:
+        plotly_js = os.path.join(out_dir, 'plotly.min.js')
+        if not os.path.exists(plotly_js):
+            write_atomic(plotly_js, plotly.offline.get_plotlyjs())
+
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    if workers > 1 and len(tasks) > 1:
+        # spawn: workers load the data themselves instead of inheriting open
+        # database connections and thread pools through fork
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            for _ in executor.map(render_airline, tasks, chunksize=max(1, len(tasks) // (workers * 4))):
+                pass
+    else:
+        for task in tasks:
+            render_airline(task)
+    elapsed = time.perf_counter() - start
+    return {'rendered': len(tasks), 'skipped': len(airlines) - len(tasks), 'seconds': elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render per-airline safety reports")
+    parser.add_argument('--out', default='reports', help="output directory")
+    parser.add_argument('--format', choices=['html', 'json'], default='html')
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument('--airline', action='append', dest='airlines', help="render only these airlines")
+    parser.add_argument('--force', action='store_true', help="re-render unchanged reports too")
+    args = parser.parse_args()
+
+    unknown = set(args.airlines or []) - set(utils.available_airlines)
+    if unknown:
+        sys.exit(f"Unknown airlines: {', '.join(sorted(unknown))}")
+    result = render_reports(args.out, args.format, args.workers, args.airlines, args.force)
+    rate = result['rendered'] / result['seconds'] if result['seconds'] else 0.0
+    print(f"Rendered {result['rendered']} reports, skipped {result['skipped']} unchanged "
+          f"in {result['seconds']:.1f}s ({rate:.1f} airlines/s)")
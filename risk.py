@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# Risk categorization engine.
+# Every airline gets a risk score and is binned into risk_labels with one
+# np.digitize over the score array. The result is a per-airline code array;
+# rows of the long table pick up their category by airline position through
+# pd.Categorical.from_codes, without a per-row string map.
+# The binning is selected with AIRLINE_SAFETY_RISK_BINS (read in utils.py):
+#   fixed       total events (incidents + fatal accidents + fatalities, both
+#               periods) in (0, 5], (5, 20], (20, inf); zero counts as Low Risk
+#   quantile    terciles of the total events
+#   exposure    terciles of the total events per 1e9 weekly seat-km
+#   5,20        custom upper edges of the lower categories, on total events
+risk_labels = ['Low Risk', 'Medium Risk', 'High Risk']
+fixed_edges = [5, 20]
+
+
+def total_events(counts):
+    # Over the (airline x period x metric) cube; unknown counts add nothing, as in a groupby sum
+    return np.nansum(np.asarray(counts, dtype=float).reshape(len(counts), -1), axis=1)
+
+
+def risk_scores(counts, exposure, method):
+    totals = total_events(counts)
+    if method == 'exposure':
+        return totals / np.asarray(exposure, dtype=float) * 1e9
+    return totals
+
+
+def risk_edges(scores, method):
+    if method == 'fixed':
+        return np.array(fixed_edges, dtype=float)
+    if method in ('quantile', 'exposure'):
+        return np.quantile(scores, np.arange(1, len(risk_labels)) / len(risk_labels))
+    try:
+        edges = np.array([float(edge) for edge in method.split(',')])
+    except ValueError:
+        raise ValueError(f"Unknown risk binning {method!r}: expected fixed, quantile, exposure "
+                         f"or {len(risk_labels) - 1} comma-separated edges") from None
+    if len(edges) != len(risk_labels) - 1 or np.any(np.diff(edges) <= 0):
+        raise ValueError(f"Custom risk edges must be {len(risk_labels) - 1} increasing numbers, got {method!r}")
+    return edges
+
+
+def risk_codes(counts, exposure, method='fixed'):
+    # Per-airline category codes (index into risk_labels) and the edges used.
+    # right=True gives pd.cut's right-closed bins; scores at or below the first
+    # edge (including zero) are Low Risk
+    scores = risk_scores(counts, exposure, method)
+    edges = risk_edges(scores, method)
+    return np.digitize(scores, edges, right=True).astype(np.int8), edges
+
+
+def risk_categorical(codes, positions):
+    # Categories for rows given as airline positions
+    return pd.Categorical.from_codes(codes[positions], categories=risk_labels, ordered=True)
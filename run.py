@@ -1,22 +1,36 @@
+import os
 import pandas as pd
 import dash_mantine_components as dmc
 import dash_ag_grid as dag
-from dash import Input, Output, callback, Dash, html, dcc, clientside_callback
+from dash import ALL, Input, Output, State, callback, Dash, html, dcc, clientside_callback
 from dash_iconify import DashIconify
-import plotly.express as px
-from plotly import data
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from flask import request
 
-from utils import (df_long, df_wide, colors, key_metrics,
-                   available_airlines, available_improvement_status,
-                   available_metrics, available_periods,
-                   available_risk_categories)
+import utils
+from charts import build_trend_figure, get_figures
+from grids import grid_rows
+from metrics import compute_key_metrics
+from risk import risk_labels
+from search import search_airlines
+from similarity import profile_columns, similar_airlines
+from warmup import record_filters, start_warmup
+from utils import (colors, available_metrics, available_periods, improvement_labels,
+                   long_columns, wide_columns, improvement_kind_columns, safety_score_weights,
+                   improvement_score_weights)
 
 # Initialize the app
-app = Dash(__name__, external_stylesheets=dmc.styles.ALL)
+# Responses are gzip/brotli compressed when flask-compress is installed (dash[compress])
+try:
+    import flask_compress  # noqa: F401
+    compress = True
+except ImportError:
+    compress = False
 
-# Custom CSS for better styling
+app = Dash(__name__, external_stylesheets=dmc.styles.ALL, compress=compress)
+server = app.server
+
+# Custom page template; styles live in assets/dashboard.css so they are
+# served as a fingerprinted, long-cached asset instead of inline on every load
 app.index_string = '''
 <!DOCTYPE html>
 <html>
@@ -25,23 +39,6 @@ app.index_string = '''
         <title>Airline Safety Dashboard</title>
         {%favicon%}
         {%css%}
-        <style>
-            body {
-                font-family: 'Inter', 'Segoe UI', system-ui, sans-serif;
-            }
-            .mantine-Paper-root {
-                transition: box-shadow 0.2s ease-in-out;
-            }
-            .mantine-Paper-root:hover {
-                box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-            }
-            .metric-card {
-                transition: transform 0.2s ease-in-out;
-            }
-            .metric-card:hover {
-                transform: translateY(-2px);
-            }
-        </style>
     </head>
     <body>
         {%app_entry%}
@@ -54,6 +51,30 @@ app.index_string = '''
 </html>
 '''
 
+# Cache headers: fingerprinted files never change under the same URL, while
+# the layout is revalidated cheaply through its ETag. The index page is left
+# alone: Dash writes a fresh id into its config on every request, so an ETag
+# on it would never match
+LONG_CACHE = 'public, max-age=31536000, immutable'
+
+
+@server.after_request
+def add_cache_headers(response):
+    path = request.path
+    if response.status_code != 200:
+        return response
+
+    if path.startswith('/_dash-component-suites/') and response.cache_control.max_age:
+        response.headers['Cache-Control'] = LONG_CACHE
+    elif path.startswith('/assets/') and request.args.get('m'):
+        response.headers['Cache-Control'] = LONG_CACHE
+    elif path == '/_dash-layout':
+        response.headers['Cache-Control'] = 'no-cache'
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
 # Header Component
 header = dmc.Paper(
     p='md',
@@ -110,7 +131,8 @@ header = dmc.Paper(
 )
 
 # Key Metrics Cards
-def create_metrics_cards():
+def create_metrics_cards(metrics=None):
+    metrics = metrics or utils.key_metrics
     return dmc.Grid(
         children=[
             dmc.GridCol(span=2, children=[
@@ -134,7 +156,7 @@ def create_metrics_cards():
                                     children=[DashIconify(icon="mdi:airplane", width=24)]
                                 ),
                                 dmc.Text("Total Airlines", size="sm", c=colors['text_secondary'], mt=5),
-                                dmc.Title(f"{key_metrics['total_airlines']:,}", order=3, c=colors['text_primary'])
+                                dmc.Title(f"{metrics['total_airlines']:,}", order=3, c=colors['text_primary'])
                             ]
                         )
                     ]
@@ -161,7 +183,7 @@ def create_metrics_cards():
                                     children=[DashIconify(icon="mdi:alert", width=24)]
                                 ),
                                 dmc.Text("Total Incidents", size="sm", c=colors['text_secondary'], mt=5),
-                                dmc.Title(f"{key_metrics['total_incidents']:,}", order=3, c=colors['text_primary'])
+                                dmc.Title(f"{metrics['total_incidents']:,}", order=3, c=colors['text_primary'])
                             ]
                         )
                     ]
@@ -188,7 +210,7 @@ def create_metrics_cards():
                                     children=[DashIconify(icon="mdi:heart-broken", width=24)]
                                 ),
                                 dmc.Text("Total Fatalities", size="sm", c=colors['text_secondary'], mt=5),
-                                dmc.Title(f"{key_metrics['total_fatalities']:,}", order=3, c=colors['text_primary'])
+                                dmc.Title(f"{metrics['total_fatalities']:,}", order=3, c=colors['text_primary'])
                             ]
                         )
                     ]
@@ -215,7 +237,7 @@ def create_metrics_cards():
                                     children=[DashIconify(icon="mdi:trending-up", width=24)]
                                 ),
                                 dmc.Text("Improved Airlines", size="sm", c=colors['text_secondary'], mt=5),
-                                dmc.Title(f"{key_metrics['improved_airlines']}", order=3, c=colors['text_primary'])
+                                dmc.Title(f"{metrics['improved_airlines']}", order=3, c=colors['text_primary'])
                             ]
                         )
                     ]
@@ -242,7 +264,7 @@ def create_metrics_cards():
                                     children=[DashIconify(icon="mdi:trending-down", width=24)]
                                 ),
                                 dmc.Text("Worsened Airlines", size="sm", c=colors['text_secondary'], mt=5),
-                                dmc.Title(f"{key_metrics['worsened_airlines']}", order=3, c=colors['text_primary'])
+                                dmc.Title(f"{metrics['worsened_airlines']}", order=3, c=colors['text_primary'])
                             ]
                         )
                     ]
@@ -269,7 +291,7 @@ def create_metrics_cards():
                                     children=[DashIconify(icon="mdi:shield", width=24)]
                                 ),
                                 dmc.Text("Avg Safety Score", size="sm", c=colors['text_secondary'], mt=5),
-                                dmc.Title(f"{key_metrics['avg_safety_score']:.2f}", order=3, c=colors['text_primary'])
+                                dmc.Title(f"{metrics['avg_safety_score']:.2f}" if metrics['total_airlines'] else "–", order=3, c=colors['text_primary'])
                             ]
                         )
                     ]
@@ -279,6 +301,12 @@ def create_metrics_cards():
         gutter="md"
     )
 
+# Filter options: every category label, so the layout needs no data; only the
+# default airline selection reads the airline names
+status_options = sorted(improvement_labels)
+risk_options = sorted(risk_labels)
+default_airlines = utils.default_airlines
+
 # Filter Components
 filters_card = dmc.Paper(
     p="md",
@@ -305,19 +333,22 @@ filters_card = dmc.Paper(
                 dmc.MultiSelect(
                     id='airlines-filter',
                     label='🏢 Airlines',
-                    data=[{'label': airline, 'value': airline} for airline in available_airlines],
-                    value=available_airlines[:5],
+                    # Options are searched server-side, see update_airline_options
+                    data=default_airlines,
+                    value=default_airlines,
                     clearable=True,
                     searchable=True,
-                    placeholder="Select airlines...",
+                    filter={"function": "keepServerOptions"},
+                    debounce=150,
+                    placeholder="Search airlines...",
                     style={'marginBottom': "15px"}
                 ),
                 
                 dmc.MultiSelect(
                     id='improvement-status',
                     label='📈 Improvement Status',
-                    data=[{'label': status, 'value': status} for status in available_improvement_status],
-                    value=available_improvement_status,
+                    data=[{'label': status, 'value': status} for status in status_options],
+                    value=status_options,
                     clearable=True,
                     searchable=True,
                     placeholder="Select improvement status...",
@@ -327,8 +358,8 @@ filters_card = dmc.Paper(
                 dmc.MultiSelect(
                     id='risk-category',
                     label='⚠️ Risk Category',
-                    data=[{'label': risk, 'value': risk} for risk in available_risk_categories],
-                    value=available_risk_categories,
+                    data=[{'label': risk, 'value': risk} for risk in risk_options],
+                    value=risk_options,
                     clearable=True,
                     searchable=True,
                     placeholder="Select risk categories...",
@@ -359,22 +390,69 @@ filters_card = dmc.Paper(
     ]
 )
 
+# What-if weights for the safety and improvement scores
+weight_labels = {
+    'incident_rate_1985_1999': 'Incident Rate 1985-1999',
+    'incident_rate_2000_2014': 'Incident Rate 2000-2014',
+    'fatality_rate_1985_1999': 'Fatality Rate 1985-1999',
+    'fatality_rate_2000_2014': 'Fatality Rate 2000-2014',
+    'incident_rate_change_pct': 'Incident Rate Change',
+    'fatality_rate_change_pct': 'Fatality Rate Change'
+}
+
+weights_card = dmc.Paper(
+    p="md",
+    withBorder=True,
+    radius="md",
+    shadow="sm",
+    style={'backgroundColor': colors['card_bg']},
+    children=[
+        dmc.Stack(
+            gap="xs",
+            children=[
+                dmc.Title("⚖️ Score Weights", order=4, c=colors['text_primary']),
+                dmc.Text("Safety score", size="sm", fw=500, c=colors['text_secondary']),
+                *[
+                    dmc.NumberInput(
+                        id={'type': 'safety-weight', 'column': col},
+                        label=weight_labels[col],
+                        value=weight, min=0, step=0.05, decimalScale=2
+                    )
+                    for col, weight in safety_score_weights.items()
+                ],
+                dmc.Text("Improvement score", size="sm", fw=500, c=colors['text_secondary'], mt=5),
+                *[
+                    dmc.NumberInput(
+                        id={'type': 'improvement-weight', 'column': col},
+                        label=weight_labels[col],
+                        value=weight, min=0, step=0.05, decimalScale=2
+                    )
+                    for col, weight in improvement_score_weights.items()
+                ]
+            ]
+        )
+    ]
+)
+
 # Main Data Grid
+# Rows are served block by block from the server (AG Grid infinite row model,
+# see grids.py), sorted and filtered there
 def create_data_grid():
     columnDefs = []
     
-    for col in df_wide.columns:
+    for col in wide_columns:
+        numeric = col not in ('airline', 'improvement_status', *improvement_kind_columns)
         columnDef = {
             'field': col,
             'headerName': col.replace('_', ' ').title(),
-            'filter': True,
+            'filter': 'agNumberColumnFilter' if numeric else 'agTextColumnFilter',
             'floatingFilter': True,
             'minWidth': 150,
             'resizable': True,
             'sortable': True
         }
         
-        if col in df_wide.select_dtypes(include=['int', 'float']).columns:
+        if numeric:
             if 'rate' in col.lower() or 'score' in col.lower():
                 columnDef['valueFormatter'] = {"function": "d3.format('.4f')(params.value)"}
             else:
@@ -416,12 +494,12 @@ def create_data_grid():
                             )
                         ]
                     ),
+                    dcc.Store(id='score-weights'),
                     dag.AgGrid(
                         id='airline-safety-grid',
                         columnDefs=columnDefs,
-                        rowData=df_wide.to_dict('records'),
+                        rowModelType="infinite",
                         defaultColDef={
-                            "filter": True,
                             "floatingFilter": True,
                             "resizable": True,
                             "sortable": True,
@@ -442,22 +520,23 @@ def create_data_grid():
         ]
     )
 
-# Detailed Data Table for df_long
+# Detailed Data Table for df_long (served like the main grid)
 def create_detailed_table():
     columnDefs = []
     
-    for col in df_long.columns:
+    for col in long_columns:
+        numeric = col in ('avail_seat_km_per_week', 'value')
         columnDef = {
             'field': col,
             'headerName': col.replace('_', ' ').title(),
-            'filter': True,
+            'filter': 'agNumberColumnFilter' if numeric else 'agTextColumnFilter',
             'floatingFilter': True,
             'minWidth': 150,
             'resizable': True,
             'sortable': True
         }
         
-        if col in df_long.select_dtypes(include=['int', 'float']).columns:
+        if numeric:
             columnDef['valueFormatter'] = {"function": "d3.format(',.0f')(params.value)"}
             columnDef['type'] = 'rightAligned'
             
@@ -499,9 +578,8 @@ def create_detailed_table():
                     dag.AgGrid(
                         id='detailed-safety-grid',
                         columnDefs=columnDefs,
-                        rowData=df_long.to_dict('records'),
+                        rowModelType="infinite",
                         defaultColDef={
-                            "filter": True,
                             "floatingFilter": True,
                             "resizable": True,
                             "sortable": True,
@@ -522,6 +600,48 @@ def create_detailed_table():
         ]
     )
 
+# Nearest-neighbour panel over the airline safety profiles
+def create_similarity_panel():
+    return dmc.Stack(
+        children=[
+            dmc.Group(
+                children=[
+                    dmc.Select(
+                        id='similarity-airline',
+                        label='Airline',
+                        # Options are searched server-side, see update_similarity_options
+                        data=default_airlines[:1],
+                        value=default_airlines[0],
+                        searchable=True,
+                        filter={"function": "keepServerOptions"},
+                        debounce=150,
+                        style={'minWidth': '250px'}
+                    ),
+                    dmc.NumberInput(
+                        id='similarity-k',
+                        label='Number of similar airlines',
+                        value=5, min=1, max=20, step=1
+                    )
+                ]
+            ),
+            dag.AgGrid(
+                id='similar-airlines-grid',
+                columnDefs=[{'field': 'airline', 'headerName': 'Airline'},
+                            {'field': 'distance', 'headerName': 'Distance',
+                             'valueFormatter': {"function": "d3.format('.3f')(params.value)"},
+                             'type': 'rightAligned'}] + [
+                    {'field': col, 'headerName': col.replace('_', ' ').title(),
+                     'valueFormatter': {"function": "d3.format('.4f')(params.value)"},
+                     'type': 'rightAligned'}
+                    for col in profile_columns
+                ],
+                rowData=[],
+                columnSize="sizeToFit",
+                style={"height": "400px", "width": "100%", "borderRadius": "8px"}
+            )
+        ]
+    )
+
 # Analytics Tabs Component
 analytics_tabs = dmc.Tabs(
     [
@@ -529,10 +649,12 @@ analytics_tabs = dmc.Tabs(
             [
                 dmc.TabsTab("📋 Detailed Data", value="detailed_data"),
                 dmc.TabsTab("📊 Incident Trends", value="incident_trends"),
+                dmc.TabsTab("📉 Yearly Trends", value="yearly_trends"),
                 dmc.TabsTab("💀 Fatalities Analysis", value="fatalities_analysis"),
                 dmc.TabsTab("📈 Safety Metrics", value="safety_metrics"),
                 dmc.TabsTab("🔥 Risk Analysis", value="risk_analysis"),
                 dmc.TabsTab("🔄 Improvement Tracking", value="improvement_tracking"),
+                dmc.TabsTab("🧭 Similar Airlines", value="similar_airlines"),
             ],
             grow=True
         ),
@@ -550,6 +672,13 @@ analytics_tabs = dmc.Tabs(
             ),
             value="incident_trends"
         ),
+        dmc.TabsPanel(
+            dmc.Container(
+                dcc.Graph(id="yearly-trends-chart"),
+                fluid=True, px=0
+            ),
+            value="yearly_trends"
+        ),
         dmc.TabsPanel(
             dmc.Container(
                 dcc.Graph(id="fatalities-analysis-chart"),
@@ -578,6 +707,13 @@ analytics_tabs = dmc.Tabs(
             ),
             value="improvement_tracking"
         ),
+        dmc.TabsPanel(
+            dmc.Container(
+                create_similarity_panel(),
+                fluid=True, px=0
+            ),
+            value="similar_airlines"
+        ),
     ],
     color="blue",
     variant="pills",
@@ -604,7 +740,8 @@ app.layout = dmc.MantineProvider(
                 download_components,  # Add download components
                 
                 # Key Metrics Cards
-                create_metrics_cards(),
+                # Filled by update_metrics_cards on load
+                html.Div(id="metrics-cards"),
                 
                 dmc.Space(h=20),
                 
@@ -613,7 +750,7 @@ app.layout = dmc.MantineProvider(
                         # Filters Column
                         dmc.GridCol(
                             span=3,
-                            children=[filters_card]
+                            children=[filters_card, dmc.Space(h=20), weights_card]
                         ),
                         
                         # Main Content Column
@@ -661,69 +798,115 @@ app.layout = dmc.MantineProvider(
     ]
 )
 
-# Client-side callbacks for export functionality
-clientside_callback(
-    """
-    function(n_clicks) {
-        if (n_clicks > 0) {
-            setTimeout(function() {
-                const grid = dash_ag_grid.getApi('airline-safety-grid');
-                if (grid) {
-                    grid.exportDataAsCsv({
-                        fileName: 'airline_safety_data.csv'
-                    });
-                }
-            }, 100);
-            return true;
-        }
-        return false;
-    }
-    """,
-    Output("export_button", "loading"),
+# Server-side export callbacks: the grids only hold the loaded blocks, so the
+# full tables are built for the download
+@app.callback(
+    Output("download-main-csv", "data"),
     Input("export_button", "n_clicks"),
     prevent_initial_call=True
 )
+def export_main_data_server(n_clicks):
+    if n_clicks:
+        return dcc.send_data_frame(utils.df_wide.to_csv, "airline_safety_data_full.csv", index=False)
 
+@app.callback(
+    Output("download-detailed-csv", "data"),
+    Input("detailed-export-button", "n_clicks"),
+    prevent_initial_call=True
+)
+def export_detailed_data_server(n_clicks):
+    if n_clicks:
+        return dcc.send_data_frame(utils.df_long.to_csv, "detailed_safety_records_full.csv", index=False)
+
+# Metric cards follow the active filters (served from precomputed aggregates)
+@app.callback(
+    Output("metrics-cards", "children"),
+    [Input("time-period", "value"),
+     Input("airlines-filter", "value"),
+     Input("improvement-status", "value"),
+     Input("risk-category", "value"),
+     Input("metric-type", "value")]
+)
+def update_metrics_cards(selected_periods, selected_airlines, improvement_status, risk_categories, metric_types):
+    return create_metrics_cards(compute_key_metrics(selected_periods, selected_airlines, improvement_status,
+                                                    risk_categories, metric_types))
+
+# Blocks of grid rows, sorted and filtered server-side
+@app.callback(
+    Output("airline-safety-grid", "getRowsResponse"),
+    Input("airline-safety-grid", "getRowsRequest"),
+    State("score-weights", "data"),
+    prevent_initial_call=True
+)
+def serve_main_grid_rows(request, weights):
+    return grid_rows('wide', request, weights)
+
+@app.callback(
+    Output("detailed-safety-grid", "getRowsResponse"),
+    Input("detailed-safety-grid", "getRowsRequest"),
+    prevent_initial_call=True
+)
+def serve_detailed_grid_rows(request):
+    return grid_rows('long', request)
+
+# Re-score all airlines in the main grid with the user's weights: the weights
+# are stored and the grid re-requests its rows, which are scored server-side
 clientside_callback(
     """
-    function(n_clicks) {
-        if (n_clicks > 0) {
-            setTimeout(function() {
-                const grid = dash_ag_grid.getApi('detailed-safety-grid');
-                if (grid) {
-                    grid.exportDataAsCsv({
-                        fileName: 'detailed_safety_records.csv'
-                    });
-                }
-            }, 100);
-            return true;
-        }
-        return false;
+    function(safetyWeights, improvementWeights) {
+        setTimeout(function() {
+            dash_ag_grid.getApiAsync('airline-safety-grid').then(function(grid) {
+                grid.purgeInfiniteCache();
+            });
+        }, 0);
+        return {
+            safety: safetyWeights.map(function(weight) { return weight || 0; }),
+            improvement: improvementWeights.map(function(weight) { return weight || 0; })
+        };
     }
     """,
-    Output("detailed-export-button", "loading"),
-    Input("detailed-export-button", "n_clicks"),
+    Output("score-weights", "data"),
+    Input({'type': 'safety-weight', 'column': ALL}, "value"),
+    Input({'type': 'improvement-weight', 'column': ALL}, "value"),
     prevent_initial_call=True
 )
 
-# Server-side export callbacks (alternative method)
+# Most similar airlines by safety profile
 @app.callback(
-    Output("download-main-csv", "data"),
-    Input("export_button", "n_clicks"),
-    prevent_initial_call=True
+    Output("similar-airlines-grid", "rowData"),
+    Input("similarity-airline", "value"),
+    Input("similarity-k", "value")
 )
-def export_main_data_server(n_clicks):
-    if n_clicks:
-        return dcc.send_data_frame(df_wide.to_csv, "airline_safety_data_full.csv", index=False)
+def update_similar_airlines(airline, k):
+    if not airline:
+        return []
+    return similar_airlines(airline, int(k or 5)).to_dict('records')
 
+# Server-side typeahead for the airlines filter (also fills the options on load)
 @app.callback(
-    Output("download-detailed-csv", "data"),
-    Input("detailed-export-button", "n_clicks"),
-    prevent_initial_call=True
+    Output("airlines-filter", "data"),
+    Input("airlines-filter", "searchValue"),
+    State("airlines-filter", "value")
 )
-def export_detailed_data_server(n_clicks):
-    if n_clicks:
-        return dcc.send_data_frame(df_long.to_csv, "detailed_safety_records_full.csv", index=False)
+def update_airline_options(search_value, selected_airlines):
+    return search_airlines(search_value or '', selected_airlines)
+
+@app.callback(
+    Output("similarity-airline", "data"),
+    Input("similarity-airline", "searchValue"),
+    State("similarity-airline", "value")
+)
+def update_similarity_options(search_value, airline):
+    return search_airlines(search_value or '', [airline] if airline else [])
+
+# Yearly trends for the selected airlines (rendered from the precomputed trend arrays)
+@app.callback(
+    Output("yearly-trends-chart", "figure"),
+    Input("airlines-filter", "value"),
+    Input("metric-type", "value")
+)
+def update_yearly_trends(selected_airlines, metric_types):
+    return build_trend_figure(selected_airlines, metric_types)
 
 # Callbacks for interactive charts
 @app.callback(
@@ -740,135 +923,16 @@ def export_detailed_data_server(n_clicks):
      Input("metric-type", "value")]
 )
 def update_charts(n_clicks, selected_periods, selected_airlines, improvement_status, risk_categories, metric_types):
-    # Filter data based on selections
-    filtered_df = df_long.copy()
-    
-    if selected_periods:
-        filtered_df = filtered_df[filtered_df['period'].isin(selected_periods)]
-    if selected_airlines:
-        filtered_df = filtered_df[filtered_df['airline'].isin(selected_airlines)]
-    if improvement_status:
-        filtered_df = filtered_df[filtered_df['improvement_status'].isin(improvement_status)]
-    if risk_categories:
-        filtered_df = filtered_df[filtered_df['risk_category'].isin(risk_categories)]
-    if metric_types:
-        filtered_df = filtered_df[filtered_df['metric_type'].isin(metric_types)]
-    
-    # Chart 1: Incident Trends
-    incident_df = filtered_df[filtered_df['metric_type'] == 'incidents']
-    fig1 = px.bar(
-        incident_df,
-        x="airline", y="value", color="period",
-        barmode="group",
-        title="✈️ Incident Trends Comparison (1985-1999 vs 2000-2014)",
-        labels={'value': 'Number of Incidents', 'airline': 'Airline'},
-        color_discrete_sequence=[colors['primary'], colors['accent']],
-        height=500
-    )
-    fig1.update_layout(
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font={'color': colors['text_primary']},
-        xaxis_tickangle=-45
-    )
-    
-    # Chart 2: Fatalities Analysis
-    fatalities_df = filtered_df[filtered_df['metric_type'] == 'fatalities']
-    fig2 = px.bar(
-        fatalities_df,
-        x="airline", y="value", color="period",
-        barmode="group",
-        title="💀 Fatalities Analysis (1985-1999 vs 2000-2014)",
-        labels={'value': 'Number of Fatalities', 'airline': 'Airline'},
-        color_discrete_sequence=[colors['danger'], colors['warning']],
-        height=500
-    )
-    fig2.update_layout(
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font={'color': colors['text_primary']},
-        xaxis_tickangle=-45
-    )
-    
-    # Chart 3: Safety Metrics Heatmap
-    pivot_data = filtered_df.pivot_table(
-        index="airline", 
-        columns=["period", "metric_type"], 
-        values="value", 
-        aggfunc="sum"
-    ).fillna(0)
-    
-    if not pivot_data.empty:
-        fig3 = px.imshow(
-            pivot_data,
-            aspect="auto",
-            title="🔥 Safety Metrics Heatmap by Airline",
-            color_continuous_scale="Blues",
-            height=600
-        )
-        fig3.update_layout(
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font={'color': colors['text_primary']}
-        )
-    else:
-        fig3 = go.Figure()
-        fig3.update_layout(
-            title="No data available for selected filters",
-            plot_bgcolor='white',
-            paper_bgcolor='white'
-        )
-    
-    # Chart 4: Risk Analysis
-    risk_analysis = filtered_df.groupby(['airline', 'risk_category'])['value'].sum().reset_index()
-    if not risk_analysis.empty:
-        fig4 = px.treemap(
-            risk_analysis,
-            path=['risk_category', 'airline'],
-            values='value',
-            title='⚠️ Risk Distribution Across Airlines',
-            color='value',
-            color_continuous_scale='RdYlGn_r',
-            height=500
-        )
-        fig4.update_layout(
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font={'color': colors['text_primary']}
-        )
-    else:
-        fig4 = go.Figure()
-        fig4.update_layout(
-            title="No data available for selected filters",
-            plot_bgcolor='white',
-            paper_bgcolor='white'
-        )
-    
-    # Chart 5: Improvement Tracking
-    improvement_data = filtered_df.groupby(['airline', 'improvement_status'])['value'].sum().reset_index()
-    if not improvement_data.empty:
-        fig5 = px.sunburst(
-            improvement_data,
-            path=['improvement_status', 'airline'],
-            values='value',
-            title='🔄 Safety Improvement Tracking',
-            height=500,
-            color_discrete_sequence=[colors['success'], colors['warning'], colors['danger'], colors['secondary'], colors['primary']]
-        )
-        fig5.update_layout(
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font={'color': colors['text_primary']}
-        )
-    else:
-        fig5 = go.Figure()
-        fig5.update_layout(
-            title="No data available for selected filters",
-            plot_bgcolor='white',
-            paper_bgcolor='white'
-        )
-    
-    return fig1, fig2, fig3, fig4, fig5
+    record_filters(selected_periods, selected_airlines, improvement_status,
+                   risk_categories, metric_types)
+    # Served from the cache shared by all workers, computed once per filter selection
+    return get_figures(selected_periods, selected_airlines, improvement_status,
+                       risk_categories, metric_types)
+
+# Precompute the default and most popular views in the background
+if os.environ.get('AIRLINE_SAFETY_WARMUP', '1') != '0':
+    # The default view, as the layout selects it
+    start_warmup(extra=[(available_periods, default_airlines, status_options, risk_options, available_metrics)])
 
 if __name__ == "__main__":
     app.run(debug=True, port=6030)
\ No newline at end of file
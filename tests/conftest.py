@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+# The dashboard modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datasource
+import datastore
+import utils
+
+
+@pytest.fixture(scope='session')
+def source_urls(tmp_path_factory):
+    # The bundled CSV and its conversions, by AIRLINE_SAFETY_SOURCE url
+    root = tmp_path_factory.mktemp('sources')
+    datastore.convert_csv(utils.csv_path, str(root / 'safety.npyds'))
+    datasource.convert_csv(utils.csv_path, str(root / 'safety.db'))
+    return {
+        'csv': utils.csv_path,
+        'store': f"store:///{root / 'safety.npyds'}",
+        'sqlite': f"sqlite:///{root / 'safety.db'}"
+    }
+
+
+def reset_utils():
+    # Drops the lazily derived values of utils so the next access rebuilds them
+    for name in set(utils._builders):
+        vars(utils).pop(name, None)
+
+
+@pytest.fixture
+def use_source(monkeypatch):
+    # Points utils at another source for the duration of a test
+    opened = []
+
+    def use(url):
+        source = datasource.open_source(url)
+        opened.append(source)
+        monkeypatch.setattr(utils, 'source', source)
+        reset_utils()
+        return source
+
+    yield use
+    reset_utils()
+    for source in opened:
+        source.close()
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import changes
+import utils
+
+
+def test_change_kinds():
+    before = np.array([0, 0, 5, 5, np.nan])
+    after = np.array([0, 3, 0, 10, 1])
+    abs_change, pct_change, log_ratio, kind = changes.change_arrays(before, after)
+    assert [changes.change_kinds[code] for code in kind] == [
+        'no_events', 'new_events', 'eliminated', 'change', 'missing']
+    np.testing.assert_array_equal(abs_change, [0, 3, -5, 5, np.nan])
+    np.testing.assert_array_equal(pct_change, [0, np.nan, -100, 100, np.nan])
+    np.testing.assert_array_equal(log_ratio, [0, np.nan, np.nan, np.log(2), np.nan])
+
+
+def test_table_matches_the_wide_frame():
+    table = changes.get_change_table()
+    df_wide = utils.df_wide.set_index('airline')
+    for metric in changes.change_metrics:
+        part = changes.metric_changes(metric).reindex(df_wide.index)
+        np.testing.assert_allclose(part['before'], df_wide[f'{metric}_1985_1999'])
+        np.testing.assert_allclose(part['after'], df_wide[f'{metric}_2000_2014'])
+    assert len(table) == len(changes.change_metrics) * len(df_wide)
+
+    row = changes.airline_change('fatalities', df_wide.index[0])
+    assert row['after'] == df_wide['fatalities_2000_2014'].iloc[0]
+
+
+@pytest.mark.parametrize('rate', ['incident_rate', 'fatality_rate'])
+def test_improvement_shows_the_change_kinds(rate):
+    df_wide = utils.df_wide.set_index('airline')
+    kinds = changes.metric_changes(rate)['change_kind'].astype(str).reindex(df_wide.index)
+    pd.testing.assert_series_equal(df_wide[f'{rate}_change_kind'], kinds, check_names=False)
+
+    new_events = kinds == 'new_events'
+    assert (df_wide.loc[new_events, 'improvement_status'] == 'Significantly Worsened').all()
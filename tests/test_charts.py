@@ -0,0 +1,62 @@
+import random
+
+import plotly.io as pio
+import pytest
+
+import charts
+import utils
+from cache import ResultCache
+from datasource import open_source
+from risk import risk_labels
+
+
+@pytest.fixture
+def chart_source(tmp_path, monkeypatch):
+    # charts on another source, with a private result cache
+    monkeypatch.setattr(charts, 'result_cache', ResultCache(str(tmp_path / 'results.sqlite')))
+    opened = []
+
+    def use(url):
+        source = open_source(url)
+        opened.append(source)
+        monkeypatch.setattr(charts, 'source', source)
+        return source
+
+    yield use
+    for source in opened:
+        source.close()
+
+
+def selections(count=12, seed=0):
+    rng = random.Random(seed)
+    options = [list(utils.available_periods), utils.available_airlines, utils.improvement_labels,
+               risk_labels, list(utils.available_metrics)]
+    yield [None] * 5
+    yield [None, None, ['Nonexistent'], None, None]
+    for _ in range(count):
+        yield [rng.sample(values, rng.randint(1, len(values))) if rng.random() < 0.6 else None
+               for values in options]
+
+
+def figures(filters):
+    return [pio.to_json(fig) for fig in charts.build_figures(charts.chart_data(*filters))]
+
+
+@pytest.mark.parametrize('kind', ['store', 'sqlite'])
+def test_pushed_down_figures_match_in_memory(chart_source, source_urls, kind):
+    chart_source(source_urls['csv'])
+    expected = [figures(filters) for filters in selections()]
+    assert not charts.source.supports_pushdown
+
+    chart_source(source_urls[kind])
+    assert charts.source.supports_pushdown
+    assert [figures(filters) for filters in selections()] == expected
+
+
+def test_in_memory_path_caches_filtered_frames(chart_source, source_urls):
+    chart_source(source_urls['csv'])
+    filters = charts.normalize_filters(['2000-2014'], None, None, ['High Risk'], None)
+    key = charts.result_cache.make_key('frame', filters)
+    assert charts.result_cache.get(key) is None
+    charts.chart_data(*filters)
+    assert charts.result_cache.get(key).equals(charts.filter_data(*filters))
@@ -0,0 +1,61 @@
+import random
+
+import pandas as pd
+import pytest
+
+import utils
+from datasource import long_columns, open_source
+
+group_bys = [['airline'], ['period'], ['metric_type'], ['airline', 'period', 'metric_type'],
+             ['airline', 'metric_type'], ['period', 'metric_type']]
+
+
+def selections(count=50, seed=0):
+    rng = random.Random(seed)
+    options = [list(utils.available_periods), utils.available_airlines, list(utils.available_metrics)]
+    yield None, None, None
+    yield None, ['Nonexistent'], None
+    for _ in range(count):
+        yield tuple(rng.sample(values, rng.randint(1, len(values))) if rng.random() < 0.6 else None
+                    for values in options)
+
+
+def expected_rows(filters):
+    # df_long filtered in memory, with its index and the derived columns dropped
+    df_long = utils.df_long[long_columns]
+    mask = pd.Series(True, index=df_long.index)
+    for column, selection in zip(['period', 'airline', 'metric_type'], filters):
+        if selection:
+            mask &= df_long[column].isin(selection)
+    return df_long[mask].reset_index(drop=True)
+
+
+def assert_same_rows(result, expected):
+    assert list(result.columns) == list(expected.columns)
+    assert result.astype(object).values.tolist() == expected.astype(object).values.tolist()
+    if len(expected):
+        assert result['value'].dtype == expected['value'].dtype
+
+
+@pytest.mark.parametrize('kind', ['store', 'sqlite'])
+def test_fetch_long_matches_df_long(source_urls, kind):
+    source = open_source(source_urls[kind])
+    try:
+        for filters in selections():
+            assert_same_rows(source.fetch_long(*filters), expected_rows(filters))
+    finally:
+        source.close()
+
+
+@pytest.mark.parametrize('kind', ['store', 'sqlite'])
+@pytest.mark.parametrize('sort', [True, False])
+def test_aggregate_matches_groupby(source_urls, kind, sort):
+    source = open_source(source_urls[kind])
+    try:
+        for filters in selections(count=20):
+            rows = expected_rows(filters)
+            for group_by in group_bys:
+                expected = rows.groupby(group_by, sort=sort)['value'].sum().reset_index()
+                assert_same_rows(source.aggregate(group_by, *filters, sort=sort), expected)
+    finally:
+        source.close()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+import utils
+from grids import grid_rows
+from scoring import score_airlines
+
+
+def rows(table, sort_model=(), filter_model=None, weights=None, start=0, end=None):
+    request = {'startRow': start, 'endRow': end, 'sortModel': list(sort_model), 'filterModel': filter_model or {}}
+    response = grid_rows(table, request, weights)
+    return pd.DataFrame(response['rowData']), response['rowCount']
+
+
+def records(frame):
+    return pd.DataFrame(frame.to_dict('records'))
+
+
+def assert_same(result, expected):
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), records(expected).reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_unsorted_blocks_are_the_frames():
+    result, count = rows('wide')
+    assert count == len(utils.df_wide)
+    assert_same(result, utils.df_wide)
+
+    result, count = rows('long', start=100, end=250)
+    assert count == len(utils.df_long)
+    assert_same(result, utils.df_long.iloc[100:250])
+
+
+def test_sorted_and_filtered_wide_rows():
+    df_wide = utils.df_wide
+    filter_model = {
+        'airline': {'filterType': 'text', 'type': 'contains', 'filter': 'AIR'},
+        'incident_rate_2000_2014': {'filterType': 'number', 'type': 'greaterThan', 'filter': 0.05}
+    }
+    sort_model = [{'colId': 'improvement_status', 'sort': 'asc'}, {'colId': 'safety_score', 'sort': 'desc'}]
+    expected = df_wide[df_wide['airline'].str.lower().str.contains('air')
+                       & (df_wide['incident_rate_2000_2014'] > 0.05)]
+    expected = expected.sort_values(['improvement_status', 'safety_score'], ascending=[True, False], kind='stable')
+
+    result, count = rows('wide', sort_model, filter_model, start=2, end=9)
+    assert count == len(expected)
+    assert_same(result, expected.iloc[2:9])
+
+
+def test_combined_conditions_on_long_rows():
+    df_long = utils.df_long
+    filter_model = {
+        'value': {'filterType': 'number', 'type': 'inRange', 'filter': 10, 'filterTo': 300},
+        'risk_category': {'filterType': 'text', 'operator': 'OR', 'conditions': [
+            {'filterType': 'text', 'type': 'equals', 'filter': 'high risk'},
+            {'filterType': 'text', 'type': 'startsWith', 'filter': 'med'}
+        ]}
+    }
+    expected = df_long[(df_long['value'] > 10) & (df_long['value'] < 300)
+                       & df_long['risk_category'].isin(['High Risk', 'Medium Risk'])]
+    expected = expected.sort_values('value', ascending=False, kind='stable')
+
+    result, count = rows('long', [{'colId': 'value', 'sort': 'desc'}], filter_model)
+    assert count == len(expected)
+    assert_same(result, expected.astype({'risk_category': str}))
+
+
+def test_rows_are_rescored_with_the_weights():
+    weights = {'safety': [1, 0, 0, 0], 'improvement': [0.5, 0.5]}
+    scores = score_airlines(weights['safety'], weights['improvement'])
+    result, _ = rows('wide', [{'colId': 'safety_score', 'sort': 'asc'}], weights=weights)
+
+    expected = utils.df_wide.copy()
+    for column in ['safety_score', 'safety_rank', 'improvement_status']:
+        expected[column] = scores[column]
+    assert_same(result, expected.sort_values('safety_score', kind='stable'))
+    assert np.all(np.diff(result['safety_score']) >= 0)
@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+import pytest
+
+import utils
+from metrics import compute_key_metrics
+
+filter_columns = ['period', 'airline', 'improvement_status', 'risk_category', 'metric_type']
+
+
+def expected_metrics(filters):
+    # The cards computed directly from df_long and df_wide
+    df_long, df_wide = utils.df_long, utils.df_wide
+    mask = np.ones(len(df_long), dtype=bool)
+    for column, selection in zip(filter_columns, filters):
+        if selection:
+            mask &= df_long[column].astype(str).isin(selection).to_numpy()
+    rows = df_long[mask]
+    airlines = df_wide[df_wide['airline'].isin(rows['airline'].unique())]
+    return {
+        'total_airlines': len(airlines),
+        'total_incidents': int(rows.loc[rows['metric_type'] == 'incidents', 'value'].sum()),
+        'total_fatalities': int(rows.loc[rows['metric_type'] == 'fatalities', 'value'].sum()),
+        'avg_safety_score': airlines['safety_score'].mean() if len(airlines) else float('nan'),
+        'improved_airlines': int(airlines['improvement_status'].str.contains('Improved').sum()),
+        'worsened_airlines': int(airlines['improvement_status'].str.contains('Worsened').sum())
+    }
+
+
+def test_unfiltered_cards_are_the_key_metrics():
+    assert compute_key_metrics() == pytest.approx(utils.key_metrics)
+
+
+def test_cards_match_filtered_rows():
+    rng = random.Random(0)
+    options = [sorted(utils.df_long[column].astype(str).unique()) for column in filter_columns]
+    for _ in range(200):
+        filters = [rng.sample(values, rng.randint(0, len(values))) if rng.random() < 0.6 else None
+                   for values in options]
+        assert compute_key_metrics(*filters) == pytest.approx(expected_metrics(filters), nan_ok=True), filters
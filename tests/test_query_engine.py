@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip('duckdb')
+pytest.importorskip('pyarrow')
+
+import utils
+from query_engine import DuckDBEngine, PandasEngine, check_parity, get_engine
+
+
+def test_duckdb_matches_pandas():
+    assert check_parity(utils.df_long) == []
+
+
+def test_duckdb_matches_pandas_on_empty_selection():
+    assert check_parity(utils.df_long.iloc[:0], selections=20) == []
+
+
+def test_get_engine():
+    assert isinstance(get_engine('pandas'), PandasEngine)
+    assert isinstance(get_engine('duckdb'), DuckDBEngine)
+    with pytest.raises(ValueError):
+        get_engine('spark')
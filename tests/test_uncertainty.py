@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uncertainty import bootstrap_intervals, rate_counts
+
+
+def test_intervals_are_jeffreys_intervals():
+    # One airline per count, exposure 1e9 so the rates equal the counts;
+    # the 95% Jeffreys intervals are chi2(2 * count + 1) quantiles / 2
+    counts = np.repeat([[10], [0]], len(rate_counts), axis=1)
+    intervals, _ = bootstrap_intervals(n_draws=20000, counts=counts, exposure=[1e9, 1e9])
+    for column in rate_counts:
+        assert intervals[f'{column}_lo'].tolist() == pytest.approx([5.14, 0.0005], rel=0.03, abs=0.002)
+        assert intervals[f'{column}_hi'].tolist() == pytest.approx([17.74, 2.51], rel=0.03)
+
+
+def test_results_depend_only_on_the_seed():
+    rng = np.random.default_rng(0)
+    counts = rng.poisson(2, (300, len(rate_counts)))
+    exposure = rng.uniform(1e8, 1e10, 300)
+    runs = [bootstrap_intervals(n_draws=100, seed=7, counts=counts, exposure=exposure,
+                                memory_budget_mb=budget, workers=workers)
+            for budget, workers in [(256, 1), (0.05, 1), (0.05, 2)]]
+    intervals, probabilities = runs[0]
+    for other_intervals, other_probabilities in runs[1:]:
+        pd.testing.assert_frame_equal(other_intervals, intervals)
+        pd.testing.assert_frame_equal(other_probabilities, probabilities)
+
+    different, _ = bootstrap_intervals(n_draws=100, seed=8, counts=counts, exposure=exposure)
+    assert not different.equals(intervals)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+derived_frames = ['df_wide', 'df_long', 'improvement_data']
+
+
+def derived(use_source, url):
+    use_source(url)
+    return {name: getattr(utils, name) for name in [*derived_frames, 'key_metrics']}
+
+
+@pytest.mark.parametrize('kind', ['store', 'sqlite'])
+def test_sources_give_the_csv_frames(use_source, source_urls, kind):
+    expected = derived(use_source, source_urls['csv'])
+    result = derived(use_source, source_urls[kind])
+    for name in derived_frames:
+        pd.testing.assert_frame_equal(result[name], expected[name])
+    assert result['key_metrics'] == pytest.approx(expected['key_metrics'])
+
+
+def test_df_wide_matches_the_csv(use_source, source_urls):
+    use_source(source_urls['csv'])
+    raw = pd.read_csv(utils.csv_path)
+    df_wide = utils.df_wide
+    assert list(df_wide.columns) == utils.wide_columns
+
+    for period, suffix in [('1985_1999', '85_99'), ('2000_2014', '00_14')]:
+        for metric, rate in utils.rate_names.items():
+            np.testing.assert_array_equal(df_wide[f'{metric}_{period}'], raw[f'{metric}_{suffix}'])
+            np.testing.assert_allclose(df_wide[f'{rate}_{period}'],
+                                       raw[f'{metric}_{suffix}'] / raw['avail_seat_km_per_week'] * 1e9)
+
+    scores = sum(df_wide[column] * weight for column, weight in utils.safety_score_weights.items())
+    np.testing.assert_allclose(df_wide['safety_score'], scores)
+    np.testing.assert_array_equal(df_wide['safety_rank'], scores.rank(method='dense'))
+
+
+def test_improvement_status_thresholds(use_source, source_urls):
+    use_source(source_urls['csv'])
+    improvement = utils.improvement_data
+    for column, rate in [('incident_rate_change_pct', 'incident_rate'),
+                         ('fatality_rate_change_pct', 'fatality_rate')]:
+        change = ((improvement[f'{rate}_2000_2014'] - improvement[f'{rate}_1985_1999'])
+                  / improvement[f'{rate}_1985_1999'] * 100).fillna(0)
+        np.testing.assert_allclose(improvement[column], change)
+
+    def categorize(score):
+        if score < -20:
+            return 'Significantly Improved'
+        if score < 0:
+            return 'Improved'
+        if score == 0:
+            return 'No Change'
+        if score <= 20:
+            return 'Worsened'
+        return 'Significantly Worsened'
+
+    assert improvement['improvement_status'].tolist() == [categorize(s) for s in improvement['improvement_score']]
+    np.testing.assert_array_equal(utils.improvement_codes([-20.5, -20, 0, 20, 20.5]), [0, 1, 2, 3, 4])
+
+
+def test_df_long_is_the_melted_csv(use_source, source_urls):
+    use_source(source_urls['csv'])
+    raw = pd.read_csv(utils.csv_path)
+    melted = raw.melt(id_vars=['airline', 'avail_seat_km_per_week'],
+                      value_vars=[f'{metric}_{suffix}' for suffix in ['85_99', '00_14']
+                                  for metric in ['incidents', 'fatal_accidents', 'fatalities']],
+                      var_name='metric', value_name='value')
+    df_long = utils.df_long
+    assert list(df_long.columns) == utils.long_columns
+    pd.testing.assert_frame_equal(df_long[['airline', 'avail_seat_km_per_week', 'value']],
+                                  melted[['airline', 'avail_seat_km_per_week', 'value']])
+    assert (df_long['period'] == np.where(melted['metric'].str.endswith('85_99'), '1985-1999', '2000-2014')).all()
+    assert (df_long['metric_type'] == melted['metric'].str.replace(r'_(85_99|00_14)$', '', regex=True)).all()
+
+    status = dict(zip(utils.df_wide['airline'], utils.df_wide['improvement_status']))
+    assert df_long['improvement_status'].tolist() == df_long['airline'].map(status).tolist()
+    codes = dict(zip(utils.wide_column('airline'), utils.airline_risk_codes))
+    assert (df_long['risk_category'].cat.codes == df_long['airline'].map(codes)).all()
+
+
+def test_airline_lists_build_no_frames(use_source, source_urls):
+    use_source(source_urls['store'])
+    assert utils.default_airlines == sorted(utils.available_airlines)[:5]
+    assert not any(name in vars(utils) for name in ['df', 'df_wide', 'df_long', 'airline_counts'])
@@ -0,0 +1,47 @@
+import json
+import threading
+
+import pytest
+
+import warmup
+
+
+@pytest.fixture
+def stats(tmp_path, monkeypatch):
+    # warmup's filter statistics in a fresh database
+    monkeypatch.setattr(warmup, 'cache_path', str(tmp_path / 'results.sqlite'))
+    monkeypatch.setattr(warmup, '_local', threading.local())
+    monkeypatch.setattr(warmup, 'FLUSH_INTERVAL', 3600.0)
+    warmup._pending.clear()
+    yield lambda: dict(warmup._connect().execute('SELECT filters, hits FROM filter_stats').fetchall())
+    warmup._pending.clear()
+
+
+def test_counts_are_buffered_until_flushed(stats):
+    for _ in range(3):
+        warmup.record_filters(['1985-1999'])
+    warmup.record_filters(None, ['Aeroflot*'])
+    assert stats() == {}
+
+    top = warmup.top_filters()
+    assert top == [(warmup.normalize_filters(['1985-1999']), 3),
+                   (warmup.normalize_filters(None, ['Aeroflot*']), 1)]
+    assert sorted(stats().values()) == [1, 3]
+
+
+def test_flush_keeps_the_most_requested(stats, monkeypatch):
+    monkeypatch.setattr(warmup, 'MAX_FILTERS', 5)
+    for i in range(10):
+        for _ in range(i + 1):
+            warmup.record_filters(None, [f'Airline {i}'])
+    warmup.flush_filters()
+    assert sorted(stats().values()) == [6, 7, 8, 9, 10]
+
+
+def test_flush_drops_stale_selections(stats):
+    warmup.record_filters(['2000-2014'])
+    warmup.flush_filters()
+    warmup._connect().execute('UPDATE filter_stats SET last_seen = last_seen - ?', (warmup.MAX_AGE + 1,))
+    warmup.record_filters(['1985-1999'])
+    warmup.flush_filters()
+    assert list(stats()) == [json.dumps(warmup.normalize_filters(['1985-1999']))]
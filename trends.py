@@ -0,0 +1,155 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from datastore import periods, metrics
+import utils
+
+# Yearly trend engine: rolling rates, exponentially weighted averages and
+# change points for every airline at once, over (airline x year) arrays.
+# Yearly counts come from AIRLINE_SAFETY_YEARLY, a CSV with one row per
+# airline and year (airline, year, incidents[, fatal_accidents, fatalities]).
+# Without it the bundled data only has 15-year period totals, which are spread
+# evenly over the years of each period: trends within a period are then flat
+# and only the step between periods shows, so results are marked as estimated.
+# Rates are events per year per 1e9 weekly seat-km (a period rate in utils is
+# 15 times the average yearly rate).
+yearly_path = os.environ.get('AIRLINE_SAFETY_YEARLY')
+
+WINDOW = 5
+EWMA_SPAN = 5
+CHANGE_THRESHOLD = 3.0
+
+
+def period_years(period):
+    start, end = period.split('-')
+    return np.arange(int(start), int(end) + 1)
+
+
+def estimated_counts(cube=None):
+    # (airline x year) arrays per metric from the period totals of the
+    # (airline x period x metric) count cube, spread evenly
+    cube = utils.airline_counts if cube is None else cube
+    years = np.concatenate([period_years(period) for period in periods])
+    counts = {}
+    for j, metric in enumerate(metrics):
+        counts[metric] = np.concatenate([
+            np.repeat(np.asarray(cube[:, i, j], dtype=float)[:, None]
+                      / len(period_years(period)), len(period_years(period)), axis=1)
+            for i, period in enumerate(periods)
+        ], axis=1)
+    return years, counts
+
+
+def load_yearly_counts(path, airlines):
+    # (airline x year) arrays per metric from a yearly CSV; NaN where unknown
+    yearly = pd.read_csv(path)
+    years = np.arange(yearly['year'].min(), yearly['year'].max() + 1)
+    rows = pd.Index(airlines).get_indexer(yearly['airline'])
+    known = rows >= 0
+    cols = yearly['year'].to_numpy()[known] - years[0]
+    counts = {}
+    for metric in metrics:
+        if metric not in yearly.columns:
+            continue
+        values = np.full((len(airlines), len(years)), np.nan)
+        values[rows[known], cols] = yearly[metric].to_numpy(dtype=float)[known]
+        counts[metric] = values
+    return years, counts
+
+
+def rolling_mean(values, window=WINDOW):
+    # Trailing mean over `window` years along axis 1, from cumulative sums;
+    # NaN until the window is complete or when a year in it is unknown
+    filled = np.nan_to_num(values)
+    sums = np.cumsum(filled, axis=1)
+    known = np.cumsum(~np.isnan(values), axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    known[:, window:] = known[:, window:] - known[:, :-window]
+    result = sums / window
+    result[:, :window - 1] = np.nan
+    result[known < window] = np.nan
+    return result
+
+
+def ewma(values, span=EWMA_SPAN):
+    # Exponentially weighted mean along axis 1 (pandas adjust=False); unknown
+    # years carry the previous average forward
+    alpha = 2 / (span + 1)
+    result = np.empty_like(values)
+    current = values[:, 0].copy()
+    result[:, 0] = current
+    for year in range(1, values.shape[1]):
+        observed = values[:, year]
+        update = np.where(np.isnan(current), observed, current + alpha * (observed - current))
+        current = np.where(np.isnan(observed), current, update)
+        result[:, year] = current
+    return result
+
+
+def change_points(values, window=WINDOW, threshold=CHANGE_THRESHOLD):
+    # Compares the `window` years before each year with the `window` years from
+    # it on; under a constant Poisson rate the count difference has variance
+    # equal to the total, giving a z-score. Years whose |z| passes the threshold
+    # and is the largest within +-window are flagged.
+    filled = np.nan_to_num(values)
+    sums = np.concatenate([np.zeros((len(values), 1)), np.cumsum(filled, axis=1)], axis=1)
+    n_years = values.shape[1]
+    z = np.full(values.shape, np.nan)
+    if n_years >= 2 * window:
+        split = np.arange(window, n_years - window + 1)
+        before = sums[:, split] - sums[:, split - window]
+        after = sums[:, split + window] - sums[:, split]
+        total = before + after
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z[:, split] = np.where(total > 0, (after - before) / np.sqrt(total), 0.0)
+
+    strength = np.nan_to_num(np.abs(z))
+    local_max = strength.copy()
+    for shift in range(1, window + 1):
+        np.maximum(local_max[:, shift:], strength[:, :-shift], out=local_max[:, shift:])
+        np.maximum(local_max[:, :-shift], strength[:, shift:], out=local_max[:, :-shift])
+    return z, (strength >= threshold) & (strength == local_max)
+
+
+class YearlyTrends:
+    def __init__(self, airlines, exposure, years, counts, estimated):
+        self.airlines = np.asarray(airlines)
+        self.positions = pd.Index(self.airlines)
+        self.years = years
+        self.estimated = estimated
+        self.metrics = {}
+        scale = 1e9 / np.asarray(exposure, dtype=float)[:, None]
+        for metric, values in counts.items():
+            self.metrics[metric] = {
+                'counts': values,
+                'rolling_rate': rolling_mean(values) * scale,
+                'ewma_rate': ewma(values) * scale
+            }
+            # Estimated years are flat within each period, so the only "change"
+            # is the step at the period boundary, an artefact of the spreading
+            if not estimated:
+                z, flags = change_points(values)
+                self.metrics[metric].update(change_z=z, change_point=flags)
+
+    def series(self, airline, metric):
+        # One airline's yearly results as a frame indexed by year
+        position = self.positions.get_loc(airline)
+        arrays = self.metrics[metric]
+        return pd.DataFrame({name: values[position] for name, values in arrays.items()},
+                            index=pd.Index(self.years, name='year'))
+
+
+def build_trends():
+    airlines, exposure = utils.wide_column('airline'), utils.airline_exposure
+    if yearly_path:
+        years, counts = load_yearly_counts(yearly_path, airlines)
+        return YearlyTrends(airlines, exposure, years, counts, estimated=False)
+    years, counts = estimated_counts()
+    return YearlyTrends(airlines, exposure, years, counts, estimated=True)
+
+
+@utils.derived('yearly_trends')
+def get_trends():
+    return build_trends()
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from scoring import dense_rank
+import utils
+from utils import safety_score_weights
+
+# Bootstrap confidence intervals for the per-airline rates and safety score.
+# Every rate is drawn from the Jeffreys posterior of its count, Gamma(observed
+# count + 1/2), over the airline's exposure; scores are recomputed for each
+# draw, and airlines are re-ranked per draw. A zero count still gets an
+# interval instead of a point mass at zero.
+#
+# Draws are generated in fixed tiles of TILE_DRAWS draws x TILE_AIRLINES
+# airlines, each with its own seed derived from (seed, tile row, tile column).
+# Any tile can therefore be regenerated independently, which lets the engine
+# walk the draws twice under a fixed memory budget:
+#   1. draw-major: all airlines for a group of draw tiles -> rank statistics
+#   2. airline-major: all draws for a group of airline tiles -> percentiles
+# Results depend only on the seed, never on the budget or the number of workers.
+rate_counts = {
+    'incident_rate_1985_1999': 'incidents_1985_1999',
+    'incident_rate_2000_2014': 'incidents_2000_2014',
+    'fatal_accident_rate_1985_1999': 'fatal_accidents_1985_1999',
+    'fatal_accident_rate_2000_2014': 'fatal_accidents_2000_2014',
+    'fatality_rate_1985_1999': 'fatalities_1985_1999',
+    'fatality_rate_2000_2014': 'fatalities_2000_2014'
+}
+
+TILE_DRAWS = 32
+TILE_AIRLINES = 128
+FULL_RANK_LIMIT = 2000  # full P(rank = r) matrix only for fleets up to this size
+
+
+def _tile_rates(counts, exposure, seed, draw_tile, airline_tile, n_draws):
+    # Resampled rates for one tile: (draws x airlines x rates), float32
+    lo, hi = airline_tile * TILE_AIRLINES, min((airline_tile + 1) * TILE_AIRLINES, len(counts))
+    size = min(TILE_DRAWS, n_draws - draw_tile * TILE_DRAWS)
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(draw_tile, airline_tile)))
+    draws = rng.gamma(counts[lo:hi] + 0.5, size=(size, hi - lo, counts.shape[1]))
+    return (draws / exposure[lo:hi, None] * 1e9).astype(np.float32)
+
+
+def _scores(rates, weights):
+    return rates @ weights.astype(np.float32)
+
+
+def _rank_stats(args):
+    # Pass 1: rank statistics over a contiguous range of draw tiles
+    counts, exposure, weights, seed, draw_tiles, n_draws, top, full = args
+    n_airlines = len(counts)
+    n_airline_tiles = -(-n_airlines // TILE_AIRLINES)
+
+    rank_sum = np.zeros(n_airlines)
+    top_counts = np.zeros((n_airlines, len(top)), dtype=np.int64)
+    rank_counts = np.zeros((n_airlines, n_airlines), dtype=np.int32) if full else None
+
+    for draw_tile in draw_tiles:
+        size = min(TILE_DRAWS, n_draws - draw_tile * TILE_DRAWS)
+        scores = np.empty((size, n_airlines), dtype=np.float32)
+        for airline_tile in range(n_airline_tiles):
+            lo = airline_tile * TILE_AIRLINES
+            rates = _tile_rates(counts, exposure, seed, draw_tile, airline_tile, n_draws)
+            scores[:, lo:lo + rates.shape[1]] = _scores(rates, weights)
+
+        ranks = dense_rank(scores.T)  # airlines x draws
+        rank_sum += ranks.sum(axis=1)
+        top_counts += (ranks[:, :, None] <= np.asarray(top)).sum(axis=1)
+        if full:
+            rows = np.repeat(np.arange(n_airlines), ranks.shape[1])
+            np.add.at(rank_counts, (rows, ranks.ravel().astype(np.int64) - 1), 1)
+    return rank_sum, top_counts, rank_counts
+
+
+def _intervals(args):
+    # Pass 2: percentile intervals over a contiguous range of airline tiles
+    counts, exposure, weights, seed, airline_tiles, n_draws, quantiles = args
+    n_draw_tiles = -(-n_draws // TILE_DRAWS)
+
+    results = []
+    for airline_tile in airline_tiles:
+        width = min(TILE_AIRLINES, len(counts) - airline_tile * TILE_AIRLINES)
+        values = np.empty((n_draws, width, counts.shape[1] + 1), dtype=np.float32)
+        for draw_tile in range(n_draw_tiles):
+            lo = draw_tile * TILE_DRAWS
+            rates = _tile_rates(counts, exposure, seed, draw_tile, airline_tile, n_draws)
+            values[lo:lo + len(rates), :, :-1] = rates
+            values[lo:lo + len(rates), :, -1] = _scores(rates, weights)
+
+        # quantiles x airlines x columns, one column at a time to bound the sort buffer
+        results.append(np.stack([np.quantile(values[:, :, i], quantiles, axis=0)
+                                 for i in range(values.shape[2])], axis=-1))
+    return np.concatenate(results, axis=1)
+
+
+def _groups(n_tiles, tiles_per_group):
+    return [range(start, min(start + tiles_per_group, n_tiles))
+            for start in range(0, n_tiles, tiles_per_group)]
+
+
+def _run(function, tasks, workers):
+    # Yields results in order as they are produced, so callers can fold them
+    # without holding every partial result in memory
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(function, tasks)
+    else:
+        for task in tasks:
+            yield function(task)
+
+
+def bootstrap_intervals(n_draws=10000, seed=0, alpha=0.05, top=(1, 5, 10), weights=None,
+                        memory_budget_mb=256, workers=1, counts=None, exposure=None, airlines=None):
+    """Bootstrap intervals for every airline's rates and safety score.
+
+    Returns (intervals, rank_probabilities). intervals has one row per airline
+    with <column>_lo/<column>_hi bounds, expected_rank and p_top_<k> columns;
+    rank_probabilities is the airline x rank matrix of P(rank = r), or None
+    for fleets larger than FULL_RANK_LIMIT. counts/exposure/airlines default to
+    df_wide and can be passed to score other fleets.
+    """
+    if counts is None:
+        counts = np.column_stack([utils.wide_column(col) for col in rate_counts.values()])
+        exposure = utils.wide_column('avail_seat_km_per_week')
+        airlines = utils.wide_column('airline')
+    counts = np.nan_to_num(np.asarray(counts, dtype=float))
+    exposure = np.asarray(exposure, dtype=float)
+    if airlines is None:
+        airlines = np.arange(len(counts))
+
+    weights = weights or safety_score_weights
+    weights = np.array([weights.get(rate, 0.0) for rate in rate_counts])
+    top = tuple(k for k in top if k <= len(counts))
+    full = len(counts) <= FULL_RANK_LIMIT
+    budget = memory_budget_mb * 2 ** 20 / max(workers, 1)
+
+    # Pass 1: draw tiles grouped so that one group of (draws x all airlines) fits the budget
+    n_draw_tiles = -(-n_draws // TILE_DRAWS)
+    bytes_per_draw_tile = TILE_DRAWS * len(counts) * 64
+    draw_groups = _groups(n_draw_tiles, max(1, int(budget // bytes_per_draw_tile)))
+    rank_sum, top_counts, rank_counts = 0, 0, 0
+    for stats in _run(_rank_stats, [(counts, exposure, weights, seed, group, n_draws, top, full)
+                                    for group in draw_groups], workers):
+        rank_sum = rank_sum + stats[0]
+        top_counts = top_counts + stats[1]
+        if full:
+            rank_counts = rank_counts + stats[2]
+
+    # Pass 2: airline tiles grouped so that (all draws x airline group) fits the budget
+    n_airline_tiles = -(-len(counts) // TILE_AIRLINES)
+    bytes_per_airline_tile = n_draws * TILE_AIRLINES * (counts.shape[1] + 1) * 6
+    airline_groups = _groups(n_airline_tiles, max(1, int(budget // bytes_per_airline_tile)))
+    quantiles = [alpha / 2, 1 - alpha / 2]
+    bounds = np.concatenate(list(_run(_intervals, [(counts, exposure, weights, seed, group, n_draws, quantiles)
+                                                   for group in airline_groups], workers)), axis=1)
+
+    intervals = pd.DataFrame({'airline': airlines})
+    for i, column in enumerate([*rate_counts, 'safety_score']):
+        intervals[f'{column}_lo'] = bounds[0, :, i]
+        intervals[f'{column}_hi'] = bounds[1, :, i]
+    intervals['expected_rank'] = rank_sum / n_draws
+    for i, k in enumerate(top):
+        intervals[f'p_top_{k}'] = top_counts[:, i] / n_draws
+
+    rank_probabilities = None
+    if full:
+        rank_probabilities = pd.DataFrame(rank_counts / n_draws, index=airlines,
+                                          columns=np.arange(1, len(counts) + 1))
+        rank_probabilities = rank_probabilities.loc[:, rank_probabilities.any(axis=0)]
+    return intervals, rank_probabilities
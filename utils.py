@@ -1,7 +1,14 @@
 import os
+import heapq
+import threading
+
 import pandas as pd
 import numpy as np
 
+from datasource import open_source
+from datastore import periods, metrics
+from risk import risk_categorical, risk_codes, risk_labels
+
 colors = {
     'background': '#F8F9FA',
     'card_bg': '#FFFFFF',
@@ -20,136 +27,273 @@ colors = {
 current_dir = os.path.dirname(__file__)
 csv_path = os.path.join(current_dir, "airline-safety.csv")
 
-df = pd.read_csv(csv_path)
+# Data source: the bundled CSV unless AIRLINE_SAFETY_SOURCE selects another
+# (a memory-mapped store or an SQLite database, see datasource.py)
+source = open_source(os.environ.get('AIRLINE_SAFETY_SOURCE', csv_path))
+
+# Risk binning (see risk.py); it changes the derived categories, so a
+# non-default binning is part of the version
+risk_binning = os.environ.get('AIRLINE_SAFETY_RISK_BINS', 'fixed')
+
+# Version of the loaded data; cached results are keyed by it so a data reload
+# never serves figures computed from an older file
+dataset_version = source.version if risk_binning == 'fixed' else f"{source.version}:risk={risk_binning}"
 
 #df = pd.read_csv("https://raw.githubusercontent.com/SmartDvi/Airline-Safety-analysis/refs/heads/main/airline-safety.csv")
 
-# Add calculated metrics
-df_wide = df.copy()
-df_wide["incident_rate_85_99"] = df_wide["incidents_85_99"] / df_wide["avail_seat_km_per_week"] * 1e9
-df_wide["incident_rate_00_14"] = df_wide["incidents_00_14"] / df_wide["avail_seat_km_per_week"] * 1e9
-
-df_wide["fatality_rate_85_99"] = df_wide["fatalities_85_99"] / df_wide["avail_seat_km_per_week"] * 1e9
-df_wide["fatality_rate_00_14"] = df_wide["fatalities_00_14"] / df_wide["avail_seat_km_per_week"] * 1e9
-
-df_wide["fatal_accident_rate_85_99"] = df_wide["fatal_accidents_85_99"] / df_wide["avail_seat_km_per_week"] * 1e9
-df_wide["fatal_accident_rate_00_14"] = df_wide["fatal_accidents_00_14"] / df_wide["avail_seat_km_per_week"] * 1e9
-
-# Custom safety score (lower is safer)
-df_wide["safety_score"] = (
-    df_wide["incident_rate_85_99"] * 0.3 +
-    df_wide["incident_rate_00_14"] * 0.3 +
-    df_wide["fatality_rate_85_99"] * 0.2 +
-    df_wide["fatality_rate_00_14"] * 0.2
-)
-
-df_wide["safety_rank"] = df_wide["safety_score"].rank(method="dense")
-
-df_wide = df_wide.rename(columns={
-    'incidents_85_99': 'incidents_1985_1999',
-    'fatal_accidents_85_99': 'fatal_accidents_1985_1999',
-    'fatalities_85_99': 'fatalities_1985_1999',
-    'incidents_00_14': 'incidents_2000_2014',
-    'fatal_accidents_00_14': 'fatal_accidents_2000_2014',
-    'fatalities_00_14': 'fatalities_2000_2014',
-    'incident_rate_85_99': 'incident_rate_1985_1999',
-    'incident_rate_00_14': 'incident_rate_2000_2014',
-    'fatality_rate_85_99': 'fatality_rate_1985_1999',
-    'fatality_rate_00_14': 'fatality_rate_2000_2014',
-    'fatal_accident_rate_85_99': 'fatal_accident_rate_1985_1999',
-    'fatal_accident_rate_00_14': 'fatal_accident_rate_2000_2014'
-})
-
-# Melting the dataset for more insights
-df_long = df.melt(
-    id_vars=["airline", "avail_seat_km_per_week"],
-    value_vars=[
-        "incidents_85_99", "fatal_accidents_85_99", "fatalities_85_99",
-        "incidents_00_14", "fatal_accidents_00_14", "fatalities_00_14",
-    ],
-    var_name="metric",
-    value_name="value"
-)
-
-df_long["period"] = df_long["metric"].apply(
-    lambda x: "1985-1999" if "85_99" in x else "2000-2014"
-)
-
-df_long["metric_type"] = df_long["metric"].apply(
-    lambda x: x.replace("_85_99", "").replace("_00_14", "")
-)
-
-df_long.drop(columns=["metric"], inplace=True)
-
-# Risk categorization
-airline_totals = df_long.groupby('airline')['value'].sum().fillna(0)
-risk_bins = [0, 5, 20, float('inf')]
-risk_labels = ['Low Risk', 'Medium Risk', 'High Risk']
-risk_categories = pd.cut(airline_totals, bins=risk_bins, labels=risk_labels)
-df_long['risk_category'] = df_long['airline'].map(risk_categories).fillna('Low Risk')
-
-# PROPER IMPROVEMENT CALCULATION - Based on rates rather than absolute values
-# Calculate improvement based on incident and fatality rates
-improvement_data = df_wide[['airline', 'incident_rate_1985_1999', 'incident_rate_2000_2014', 
-                           'fatality_rate_1985_1999', 'fatality_rate_2000_2014']].copy()
-
-# Calculate percentage change for incidents and fatalities
-improvement_data['incident_rate_change_pct'] = (
-    (improvement_data['incident_rate_2000_2014'] - improvement_data['incident_rate_1985_1999']) / 
-    improvement_data['incident_rate_1985_1999'] * 100
-).fillna(0)
-
-improvement_data['fatality_rate_change_pct'] = (
-    (improvement_data['fatality_rate_2000_2014'] - improvement_data['fatality_rate_1985_1999']) / 
-    improvement_data['fatality_rate_1985_1999'] * 100
-).fillna(0)
-
-# Combined improvement score (negative change means improvement)
-improvement_data['improvement_score'] = (
-    improvement_data['incident_rate_change_pct'] * 0.6 + 
-    improvement_data['fatality_rate_change_pct'] * 0.4
-)
-
-# Categorize improvement status
-def categorize_improvement(row):
-    if row['improvement_score'] < -20:  # Significant improvement
-        return 'Significantly Improved'
-    elif row['improvement_score'] < 0:   # Moderate improvement
-        return 'Improved'
-    elif row['improvement_score'] == 0:  # No change
-        return 'No Change'
-    elif row['improvement_score'] <= 20: # Moderate worsening
-        return 'Worsened'
-    else:                                # Significant worsening
-        return 'Significantly Worsened'
-
-improvement_data['improvement_status'] = improvement_data.apply(categorize_improvement, axis=1)
-
-# Map improvement status back to main dataframes
-improvement_status_map = improvement_data.set_index('airline')['improvement_status']
-df_long['improvement_status'] = df_long['airline'].map(improvement_status_map).fillna('No Change')
-df_wide['improvement_status'] = df_wide['airline'].map(improvement_status_map).fillna('No Change')
+# Custom safety score (lower is safer); the weights can be overridden per request, see scoring.py
+safety_score_weights = {
+    'incident_rate_1985_1999': 0.3,
+    'incident_rate_2000_2014': 0.3,
+    'fatality_rate_1985_1999': 0.2,
+    'fatality_rate_2000_2014': 0.2
+}
+
+# Combined improvement score (negative change means improvement), from the
+# percentage change of each rate between the two periods
+improvement_score_weights = {
+    'incident_rate_change_pct': 0.6,
+    'fatality_rate_change_pct': 0.4
+}
+improvement_labels = ['Significantly Improved', 'Improved', 'No Change', 'Worsened', 'Significantly Worsened']
+# How each of those percentage changes came about (see changes.py)
+improvement_kind_columns = [column.replace('_pct', '_kind') for column in improvement_score_weights]
+
+# Periods and metrics are fixed by the data layout
+available_periods = list(periods)
+available_metrics = sorted(metrics)
+
+# Columns of df_wide, each count and rate mapped to its (period, metric) cell
+# of the count cube
+period_names = {period: period.replace('-', '_') for period in periods}
+rate_names = {'incidents': 'incident_rate', 'fatalities': 'fatality_rate', 'fatal_accidents': 'fatal_accident_rate'}
+count_columns = {
+    f'{metric}_{period_names[period]}': (i, j)
+    for i, period in enumerate(periods) for j, metric in enumerate(metrics)
+}
+rate_columns = {
+    f'{rate}_{period_names[period]}': (i, metrics.index(metric))
+    for metric, rate in rate_names.items() for i, period in enumerate(periods)
+}
+wide_columns = ['airline', 'avail_seat_km_per_week', *count_columns, *rate_columns,
+                'safety_score', 'safety_rank', 'improvement_status', *improvement_kind_columns]
+long_columns = ['airline', 'avail_seat_km_per_week', 'value', 'period', 'metric_type',
+                'risk_category', 'improvement_status']
+
+# Everything below is derived on first access through the module __getattr__,
+# so importing utils reads no data. Per-airline results are numpy arrays over
+# the source's count cube (for the store: the memory-mapped file itself); the
+# pandas frames df, df_wide, df_long and improvement_data are only built when
+# something asks for them.
+_builders = {}
+_lock = threading.RLock()
+
+
+def _lazy(*names):
+    # Registers a function computing these module attributes on first access
+    def register(builder):
+        _builders.update(dict.fromkeys(names, builder))
+        return builder
+    return register
+
+
+def _value(name):
+    if name not in globals():
+        with _lock:
+            if name not in globals():
+                globals().update(_builders[name]())
+    return globals()[name]
+
+
+def __getattr__(name):
+    if name not in _builders:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return _value(name)
+
+
+def derived(name):
+    # Registers another module's value derived from the data (an index, lookup
+    # tables...) as one of these lazy attributes: the decorated function builds
+    # it on the first call, and every later call returns the same object
+    def register(builder):
+        _builders[name] = lambda: {name: builder()}
+
+        def get():
+            return _value(name)
+        return get
+    return register
+
+
+def improvement_codes(scores):
+    # Improvement status of each score, as an index into improvement_labels
+    scores = np.asarray(scores, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return np.select(
+            [scores < -20,   # Significant improvement
+             scores < 0,     # Moderate improvement
+             scores == 0,    # No change
+             scores <= 20],  # Moderate worsening
+            [0, 1, 2, 3],
+            default=4        # Significant worsening
+        ).astype(np.int8)
+
+
+@_lazy('airline_exposure', 'airline_counts', 'airline_rates', 'safety_scores', 'safety_ranks',
+       'improvement_changes', 'improvement_change_kinds', 'improvement_scores', 'airline_status_codes',
+       'airline_risk_codes', 'risk_edges')
+def _airline_arrays():
+    from changes import change_arrays, change_kinds  # changes.py builds on this module
+
+    exposure, counts = source.arrays()
+
+    # Add calculated metrics: events per 1e9 weekly seat-km, (airline x period x metric)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = counts / np.asarray(exposure, dtype=float)[:, None, None] * 1e9
+    safety = sum(rates[:, i, j] * safety_score_weights[column]
+                 for column, (i, j) in rate_columns.items() if column in safety_score_weights)
+
+    # PROPER IMPROVEMENT CALCULATION - Based on rates rather than absolute values:
+    # the percentage change of each rate from the change engine, which reports
+    # the zero-base cases as change kinds. For the score, new events (0 -> n)
+    # are an unbounded rise and unknown rates count as no change
+    j = [metrics.index(next(metric for metric, rate in rate_names.items() if column.startswith(rate)))
+         for column in improvement_score_weights]
+    _, changes, _, kinds = change_arrays(rates[:, 0, j], rates[:, -1, j])
+    changes[kinds == change_kinds.index('new_events')] = np.inf
+    changes[np.isnan(changes)] = 0
+    improvement = sum(changes[:, k] * weight for k, weight in enumerate(improvement_score_weights.values()))
+
+    # Risk categorization (binning configurable, see risk.py): one code per airline
+    airline_risk_codes, edges = risk_codes(counts, exposure, risk_binning)
+    return {
+        'airline_exposure': exposure,
+        'airline_counts': counts,
+        'airline_rates': rates,
+        'safety_scores': safety,
+        'safety_ranks': pd.Series(safety).rank(method="dense").to_numpy(),
+        'improvement_changes': changes,
+        'improvement_change_kinds': np.take(np.array(change_kinds, dtype=object), kinds),
+        'improvement_scores': improvement,
+        'airline_status_codes': improvement_codes(improvement),
+        'airline_risk_codes': airline_risk_codes,
+        'risk_edges': edges
+    }
+
+
+@_lazy('airline_names')
+def _airline_names():
+    return {'airline_names': source.airlines()}
+
+
+@_lazy('airline_index')
+def _airline_index():
+    # Position of every airline by name
+    return {'airline_index': {airline: i for i, airline in enumerate(_value('airline_names'))}}
+
 
 # Get unique values for filters
-available_periods = sorted([p for p in df_long['period'].unique() if pd.notna(p)])
-available_metrics = sorted([m for m in df_long['metric_type'].unique() if pd.notna(m)])
-available_risk_categories = sorted([r for r in df_long['risk_category'].unique() if pd.notna(r)])
-available_improvement_status = sorted([i for i in df_long['improvement_status'].unique() if pd.notna(i)])
-available_airlines = sorted([a for a in df_long['airline'].unique() if pd.notna(a)])
+@_lazy('available_airlines')
+def _available_airlines():
+    return {'available_airlines': sorted(a for a in _value('airline_names') if pd.notna(a))}
+
+
+@_lazy('default_airlines')
+def _default_airlines():
+    # The first five airlines alphabetically, without sorting them all
+    return {'default_airlines': heapq.nsmallest(5, (a for a in _value('airline_names') if pd.notna(a)))}
+
+
+@_lazy('available_risk_categories', 'available_improvement_status')
+def _available_categories():
+    return {
+        'available_risk_categories': sorted(risk_labels[code] for code in np.unique(_value('airline_risk_codes'))),
+        'available_improvement_status': sorted(improvement_labels[code]
+                                               for code in np.unique(_value('airline_status_codes')))
+    }
+
+
+def wide_column(column, positions=None):
+    # One column of df_wide (or of improvement_data) as an array, for all
+    # airlines or only those at the given positions
+    rows = slice(None) if positions is None else positions
+    if column == 'airline':
+        names = _value('airline_names')
+        return np.array(names if positions is None else [names[i] for i in positions], dtype=object)
+    if column == 'avail_seat_km_per_week':
+        return np.asarray(_value('airline_exposure'))[rows]
+    if column in count_columns:
+        # Whole counts as int64, as read_csv infers them
+        values = np.asarray(_value('airline_counts')[rows, count_columns[column][0], count_columns[column][1]])
+        return values.astype(np.float64 if np.isnan(values).any() else np.int64)
+    if column in rate_columns:
+        return _value('airline_rates')[rows, rate_columns[column][0], rate_columns[column][1]]
+    if column in improvement_score_weights:
+        return _value('improvement_changes')[rows, list(improvement_score_weights).index(column)]
+    if column in improvement_kind_columns:
+        return _value('improvement_change_kinds')[rows, improvement_kind_columns.index(column)]
+    if column == 'improvement_status':
+        return np.take(np.array(improvement_labels, dtype=object), _value('airline_status_codes')[rows])
+    arrays = {'safety_score': 'safety_scores', 'safety_rank': 'safety_ranks', 'improvement_score': 'improvement_scores'}
+    if column in arrays:
+        return _value(arrays[column])[rows]
+    raise KeyError(column)
+
+
+def wide_frame(columns=wide_columns, positions=None):
+    return pd.DataFrame({column: wide_column(column, positions) for column in columns})
+
+
+@_lazy('df')
+def _raw_frame():
+    return {'df': source.load_frame()}
+
+
+@_lazy('df_wide')
+def _wide_frame():
+    return {'df_wide': wide_frame()}
+
+
+@_lazy('improvement_data')
+def _improvement_frame():
+    return {'improvement_data': wide_frame([
+        'airline', 'incident_rate_1985_1999', 'incident_rate_2000_2014',
+        'fatality_rate_1985_1999', 'fatality_rate_2000_2014',
+        *improvement_score_weights, 'improvement_score', 'improvement_status', *improvement_kind_columns
+    ])}
+
+
+@_lazy('df_long')
+def _long_frame():
+    # Melted layout: one row per airline, period and metric, period-major with
+    # the airlines repeated in order within each (period, metric) block
+    counts = _value('airline_counts')
+    n_airlines, n_blocks = len(counts), len(periods) * len(metrics)
+    positions = np.tile(np.arange(n_airlines), n_blocks)
+    values = np.asarray(counts).reshape(n_airlines, n_blocks).T.ravel()
+    df_long = pd.DataFrame({
+        'airline': wide_column('airline')[positions],
+        'avail_seat_km_per_week': np.asarray(_value('airline_exposure'))[positions],
+        'value': values.astype(np.float64 if np.isnan(values).any() else np.int64),
+        'period': np.repeat(list(periods), len(metrics) * n_airlines),
+        'metric_type': np.tile(np.repeat(metrics, n_airlines), len(periods))
+    })
+    # Per-airline categories joined onto the long rows by airline position
+    df_long['risk_category'] = risk_categorical(_value('airline_risk_codes'), positions)
+    df_long['improvement_status'] = wide_column('improvement_status')[positions]
+    return {'df_long': df_long}
+
 
 # Calculate key metrics for the cards
-total_airlines = len(df_wide)
-total_incidents = df_long[df_long['metric_type'] == 'incidents']['value'].sum()
-total_fatalities = df_long[df_long['metric_type'] == 'fatalities']['value'].sum()
-avg_safety_score = df_wide['safety_score'].mean()
-improved_airlines = len(improvement_data[improvement_data['improvement_status'].str.contains('Improved')])
-worsened_airlines = len(improvement_data[improvement_data['improvement_status'].str.contains('Worsened')])
-
-key_metrics = {
-    'total_airlines': total_airlines,
-    'total_incidents': total_incidents,
-    'total_fatalities': total_fatalities,
-    'avg_safety_score': avg_safety_score,
-    'improved_airlines': improved_airlines,
-    'worsened_airlines': worsened_airlines
-}
\ No newline at end of file
+@_lazy('key_metrics')
+def _key_metrics():
+    counts, statuses = _value('airline_counts'), _value('airline_status_codes')
+    scores = _value('safety_scores')
+    scored = scores[~np.isnan(scores)]
+    return {'key_metrics': {
+        'total_airlines': len(statuses),
+        'total_incidents': int(np.nansum(counts[:, :, metrics.index('incidents')], dtype=np.float64)),
+        'total_fatalities': int(np.nansum(counts[:, :, metrics.index('fatalities')], dtype=np.float64)),
+        'avg_safety_score': scored.mean() if len(scored) else float('nan'),
+        'improved_airlines': int(np.isin(statuses, [i for i, s in enumerate(improvement_labels) if 'Improved' in s]).sum()),
+        'worsened_airlines': int(np.isin(statuses, [i for i, s in enumerate(improvement_labels) if 'Worsened' in s]).sum())
+    }}
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from collections import Counter
+
+from cache import cache_path, result_cache
+from charts import get_figures, normalize_filters
+import utils
+from utils import available_periods, dataset_version
+
+logger = logging.getLogger(__name__)
+
+# Cache warm-up for update_charts.
+# Every filter selection served by the dashboard is counted in the shared cache
+# database; when a dataset version is loaded the most requested selections are
+# precomputed in the background so the first users after a deploy hit a warm cache.
+# Counts are buffered per process and written at most every FLUSH_INTERVAL
+# seconds, so requests don't write to the shared file. Arbitrary airline
+# selections make the key space unbounded: a flush drops selections not seen for
+# MAX_AGE seconds and keeps only the MAX_FILTERS most requested ones.
+TOP_K = int(os.environ.get('AIRLINE_SAFETY_WARMUP_TOP_K', 50))
+MAX_FILTERS = int(os.environ.get('AIRLINE_SAFETY_WARMUP_MAX_FILTERS', 1000))
+MAX_AGE = 30 * 24 * 3600.0
+FLUSH_INTERVAL = 10.0
+report_path = os.path.join(os.path.dirname(cache_path), 'warmup.json')
+
+_local = threading.local()
+_pending = Counter()
+_pending_lock = threading.Lock()
+_pending_state = {'pid': os.getpid(), 'flushed': time.time()}
+
+
+def _connect():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(cache_path, timeout=30, isolation_level=None)
+        conn.execute('CREATE TABLE IF NOT EXISTS filter_stats (filters TEXT PRIMARY KEY, hits INTEGER, last_seen REAL)')
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def record_filters(*filters):
+    filters = json.dumps(normalize_filters(*filters))
+    with _pending_lock:
+        if _pending_state['pid'] != os.getpid():
+            # Counts inherited through fork belong to the parent
+            _pending.clear()
+            _pending_state['pid'] = os.getpid()
+        _pending[filters] += 1
+        due = time.time() - _pending_state['flushed'] >= FLUSH_INTERVAL
+    if due:
+        flush_filters()
+
+
+def flush_filters():
+    # Writes the buffered counts in one transaction, then prunes the table
+    with _pending_lock:
+        if _pending_state['pid'] != os.getpid():
+            _pending.clear()
+            _pending_state['pid'] = os.getpid()
+        pending = list(_pending.items())
+        _pending.clear()
+        _pending_state['flushed'] = now = time.time()
+    if not pending:
+        return
+    conn = _connect()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany(
+            'INSERT INTO filter_stats (filters, hits, last_seen) VALUES (?, ?, ?) '
+            'ON CONFLICT(filters) DO UPDATE SET hits = hits + excluded.hits, last_seen = excluded.last_seen',
+            [(filters, hits, now) for filters, hits in pending]
+        )
+        conn.execute('DELETE FROM filter_stats WHERE last_seen < ?', (now - MAX_AGE,))
+        conn.execute('DELETE FROM filter_stats WHERE filters NOT IN '
+                     '(SELECT filters FROM filter_stats ORDER BY hits DESC, last_seen DESC LIMIT ?)',
+                     (MAX_FILTERS,))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+atexit.register(flush_filters)
+
+
+def top_filters(k=TOP_K):
+    flush_filters()
+    rows = _connect().execute(
+        'SELECT filters, hits FROM filter_stats ORDER BY hits DESC, last_seen DESC LIMIT ?', (k,)
+    ).fetchall()
+    return [(normalize_filters(*json.loads(filters)), hits) for filters, hits in rows]
+
+
+def warmup_candidates(k=TOP_K, extra=()):
+    # Fixed views first (no filter, each single period, each risk category),
+    # then the most popular recorded selections
+    candidates = [normalize_filters()]
+    candidates += [normalize_filters(selected_periods=[period]) for period in available_periods]
+    candidates += [normalize_filters(risk_categories=[risk]) for risk in utils.available_risk_categories]
+    candidates += [normalize_filters(*filters) for filters in extra]
+    candidates += [filters for filters, _ in top_filters(k)]
+    return list(dict.fromkeys(candidates))
+
+
+def run_warmup(k=TOP_K, extra=()):
+    start = time.perf_counter()
+    candidates = warmup_candidates(k, extra)
+
+    already_cached = 0
+    for filters in candidates:
+        if result_cache.get(result_cache.make_key('figures', filters)) is not None:
+            already_cached += 1
+        else:
+            get_figures(*filters)
+
+    # Coverage: share of all recorded requests whose selection is now warm
+    stats = _connect().execute('SELECT filters, hits FROM filter_stats').fetchall()
+    total_hits = sum(hits for _, hits in stats)
+    warm = set(candidates)
+    covered_hits = sum(hits for filters, hits in stats
+                       if normalize_filters(*json.loads(filters)) in warm)
+
+    report = {
+        'dataset_version': dataset_version,
+        'views': len(candidates),
+        'already_cached': already_cached,
+        'computed': len(candidates) - already_cached,
+        'seconds': round(time.perf_counter() - start, 3),
+        'recorded_requests': total_hits,
+        'coverage': round(covered_hits / total_hits, 4) if total_hits else None,
+        'top_filters': [[list(map(list, filters)), hits] for filters, hits in top_filters(k)],
+    }
+    # Every worker writes the report: replace it atomically, through a file of its own
+    tmp = f"{report_path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, report_path)
+
+    logger.info('Cache warm-up: %d views (%d computed) in %.2fs, coverage %s',
+                report['views'], report['computed'], report['seconds'], report['coverage'])
+    return report
+
+
+def start_warmup(k=TOP_K, extra=()):
+    # Runs in a daemon thread so it never delays startup; concurrent workers
+    # doing the same are deduplicated by the cache's single-flight lock
+    thread = threading.Thread(target=run_warmup, args=(k, extra), name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    print(json.dumps(run_warmup(), indent=2))